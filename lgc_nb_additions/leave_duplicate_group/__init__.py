@@ -1,5 +1,6 @@
 from nonebot.plugin import PluginMetadata, inherit_supported_adapters
 
+from . import coordination as coordination
 from . import main as main
 
 __plugin_meta__ = PluginMetadata(
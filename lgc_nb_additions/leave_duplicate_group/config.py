@@ -0,0 +1,31 @@
+import os
+import socket
+
+from cookit.pyd import model_with_alias_generator
+from nonebot import get_plugin_config
+from pydantic import BaseModel, Field
+
+from .planner import PlanMode
+
+
+@model_with_alias_generator(lambda x: f"lgc_leave_duplicate_group_{x}")
+class ConfigModel(BaseModel):
+    plan_mode: PlanMode = PlanMode.BALANCED
+    # 每个 Bot 可连续退群的次数
+    quit_burst: int = Field(default=1, ge=1)
+    # 每个 Bot 每分钟恢复的退群次数
+    quit_rate: float = Field(default=8, gt=0)
+    # 规划时并发获取提示目标的请求数
+    notify_prefetch_concurrency: int = Field(default=8, ge=1)
+
+    # 多实例协同，各实例通过数据库共享 Bot 群列表并由选出的主实例统一规划
+    coordinate: bool = False
+    instance_id: str = Field(
+        default_factory=lambda: f"{socket.gethostname()}:{os.getpid()}",
+    )
+    # 单位均为秒
+    coordinate_interval: float = Field(default=30, gt=0)
+    lease_ttl: float = Field(default=90, gt=0)
+
+
+config: ConfigModel = get_plugin_config(ConfigModel)
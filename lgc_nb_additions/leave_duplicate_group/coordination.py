@@ -0,0 +1,204 @@
+import asyncio
+import time
+from collections import defaultdict
+
+from cookit.loguru import logged_suppress
+from nonebot import get_bots, logger
+from nonebot.adapters import Bot as BaseBot
+from nonebot_plugin_apscheduler import scheduler
+from nonebot_plugin_orm import get_session
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..uniapi.collectors import guild_quitter
+from .config import config
+from .db import BotMembership, Lease, QuitPlan
+from .index import GuildIndex, get_index, indexes
+from .main import (
+    fetch_guild_notify_targets,
+    schedule_quit_and_notice,
+    sync_index,
+)
+from .planner import plan
+
+LEASE_NAME = "planner"
+
+coordinate_lock = asyncio.Lock()
+# 已交给退群调度器但尚未完成的 (bot_id, guild_id)
+claimed: set[tuple[str, str]] = set()
+
+
+async def publish_membership():
+    bots = get_bots()
+    # 补上尚未索引的 Bot，如连接时获取群列表失败的
+    supported = [x for x in bots.values() if guild_quitter.supported(x)]
+    await asyncio.gather(*(sync_index(get_index(x), [x]) for x in supported))
+
+    now = time.time()
+    async with get_session() as ss, ss.begin():
+        for adapter, index in indexes.items():
+            for bot_id, guilds in index.bot_guilds.items():
+                if bot_id not in bots:
+                    continue
+                await ss.merge(
+                    BotMembership(
+                        bot_id=bot_id,
+                        adapter=adapter,
+                        instance_id=config.instance_id,
+                        guilds=sorted(guilds),
+                        updated_at=now,
+                    ),
+                )
+        await ss.execute(
+            delete(BotMembership).where(
+                BotMembership.instance_id == config.instance_id,
+                BotMembership.bot_id.not_in(list(bots)),
+            ),
+        )
+
+
+async def acquire_lease() -> bool:
+    now = time.time()
+    expires_at = now + config.lease_ttl
+    async with get_session() as ss:
+        result = await ss.execute(
+            update(Lease)
+            .where(
+                Lease.name == LEASE_NAME,
+                or_(Lease.holder == config.instance_id, Lease.expires_at < now),
+            )
+            .values(holder=config.instance_id, expires_at=expires_at),
+        )
+        if result.rowcount:
+            await ss.commit()
+            return True
+
+        ss.add(Lease(name=LEASE_NAME, holder=config.instance_id, expires_at=expires_at))
+        try:
+            await ss.commit()
+        except IntegrityError:
+            return False
+        return True
+
+
+async def distribute_plan():
+    now = time.time()
+    async with get_session() as ss:
+        memberships = (
+            await ss.scalars(
+                select(BotMembership).where(
+                    BotMembership.updated_at >= now - config.lease_ttl,
+                ),
+            )
+        ).all()
+        previous = (await ss.scalars(select(QuitPlan))).all()
+
+    adapter_indexes = defaultdict[str, GuildIndex](GuildIndex)
+    for membership in memberships:
+        adapter_indexes[membership.adapter].set_bot(
+            membership.bot_id,
+            membership.guilds,
+        )
+
+    # 之前轮次的退群可能仍在各实例的队列中，已定的保留 Bot 不再变动
+    # guild_id: keeper_id
+    previous_keepers = {p.guild_id: p.keeper_id for p in previous}
+    # guild_id: 已安排退出的 bot_ids
+    previous_quits = defaultdict[str, set[str]](set)
+    for p in previous:
+        previous_quits[p.guild_id].add(p.bot_id)
+
+    plans: list[QuitPlan] = []
+    for index in adapter_indexes.values():
+        keepers: dict[str, str] = {}
+        guild_bots: dict[str, list[str]] = {}
+        for guild_id in index.duplicated:
+            bot_ids = index.bots_in(guild_id)
+            if (keeper_id := previous_keepers.get(guild_id)) in bot_ids:
+                keepers[guild_id] = keeper_id
+                continue
+            # 已安排退出的 Bot 不能再被选为保留
+            candidates = [x for x in bot_ids if x not in previous_quits[guild_id]]
+            if not candidates:
+                logger.warning(
+                    f"All bots in {guild_id} are already scheduled to quit,"
+                    f" skipped planning",
+                )
+                continue
+            guild_bots[guild_id] = candidates
+
+        keepers.update(
+            plan(
+                guild_bots,
+                {x: index.guild_count(x) for x in index.bot_guilds},
+                config.plan_mode,
+            ),
+        )
+        plans.extend(
+            QuitPlan(bot_id=b, guild_id=g, keeper_id=k, created_at=now)
+            for g, k in keepers.items()
+            for b in index.bots_in(g)
+            if b != k
+        )
+
+    async with get_session() as ss, ss.begin():
+        await ss.execute(delete(QuitPlan))
+        ss.add_all(plans)
+    logger.info(f"Distributed {len(plans)} quit plans")
+
+
+async def execute_plan():
+    bots = get_bots()
+    now = time.time()
+    async with get_session() as ss:
+        plans = (
+            await ss.scalars(
+                select(QuitPlan).where(
+                    QuitPlan.bot_id.in_(list(bots)),
+                    QuitPlan.created_at >= now - config.lease_ttl,
+                ),
+            )
+        ).all()
+
+    # guild_id: (keeper_id, quit_bots)
+    guild_plans: dict[str, tuple[str, list[BaseBot]]] = {}
+    for p in plans:
+        key = (p.bot_id, p.guild_id)
+        bot = bots[p.bot_id]
+        index = indexes[bot.adapter.get_name()]
+        if (key in claimed) or (p.guild_id not in index.bot_guilds.get(p.bot_id, ())):
+            continue
+        guild_plans.setdefault(p.guild_id, (p.keeper_id, []))[1].append(bot)
+
+    for guild_id, (keeper_id, quit_bots) in guild_plans.items():
+        # 保留的 Bot 不在本实例时由其他实例提示
+        notifier = bots.get(keeper_id)
+        notify_targets = (
+            await fetch_guild_notify_targets(notifier, guild_id) if notifier else None
+        )
+        futures = schedule_quit_and_notice(
+            guild_id,
+            quit_bots,
+            notifier,
+            notify_targets,
+        )
+        for bot, future in zip(quit_bots, futures):
+            key = (bot.self_id, guild_id)
+            claimed.add(key)
+            future.add_done_callback(lambda _, k=key: claimed.discard(k))
+
+    if guild_plans:
+        logger.info(f"Scheduled quits from {len(guild_plans)} guilds by plan")
+
+
+async def coordinate():
+    async with coordinate_lock:
+        with logged_suppress("Failed to coordinate with other instances"):
+            await publish_membership()
+            if await acquire_lease():
+                await distribute_plan()
+            await execute_plan()
+
+
+if config.coordinate:
+    scheduler.add_job(coordinate, "interval", seconds=config.coordinate_interval)
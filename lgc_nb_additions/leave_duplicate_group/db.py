@@ -0,0 +1,31 @@
+from nonebot_plugin_orm import Model
+from sqlalchemy import JSON
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class BotMembership(Model):
+    __tablename__ = "lgc_leave_duplicate_group_bot_membership"
+
+    bot_id: Mapped[str] = mapped_column(primary_key=True)
+    adapter: Mapped[str]
+    instance_id: Mapped[str]
+    guilds: Mapped[list[str]] = mapped_column(JSON)
+    updated_at: Mapped[float]
+
+
+class Lease(Model):
+    __tablename__ = "lgc_leave_duplicate_group_lease"
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    holder: Mapped[str]
+    expires_at: Mapped[float]
+
+
+class QuitPlan(Model):
+    __tablename__ = "lgc_leave_duplicate_group_quit_plan"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    bot_id: Mapped[str] = mapped_column(index=True)
+    guild_id: Mapped[str]
+    keeper_id: Mapped[str]
+    created_at: Mapped[float]
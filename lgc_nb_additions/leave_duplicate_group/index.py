@@ -0,0 +1,68 @@
+from collections import defaultdict
+from collections.abc import Iterable
+
+from nonebot.adapters import Bot as BaseBot
+
+
+class GuildIndex:
+    def __init__(self) -> None:
+        # guild_id: set[bot_id]
+        self.guild_bots: dict[str, set[str]] = {}
+        # bot_id: set[guild_id]
+        self.bot_guilds: dict[str, set[str]] = {}
+        # 有多个 Bot 的 guild_id
+        self.duplicated: set[str] = set()
+
+    def __contains__(self, bot_id: str) -> bool:
+        return bot_id in self.bot_guilds
+
+    def _link(self, bot_id: str, guild_id: str):
+        bots = self.guild_bots.setdefault(guild_id, set())
+        bots.add(bot_id)
+        if len(bots) > 1:
+            self.duplicated.add(guild_id)
+
+    def _unlink(self, bot_id: str, guild_id: str):
+        if (bots := self.guild_bots.get(guild_id)) is None:
+            return
+        bots.discard(bot_id)
+        if len(bots) <= 1:
+            self.duplicated.discard(guild_id)
+        if not bots:
+            del self.guild_bots[guild_id]
+
+    def set_bot(self, bot_id: str, guild_ids: Iterable[str]):
+        self.remove_bot(bot_id)
+        guilds = self.bot_guilds[bot_id] = set(guild_ids)
+        for guild_id in guilds:
+            self._link(bot_id, guild_id)
+
+    def remove_bot(self, bot_id: str):
+        for guild_id in self.bot_guilds.pop(bot_id, ()):
+            self._unlink(bot_id, guild_id)
+
+    def add(self, bot_id: str, guild_id: str):
+        # 尚未索引的 Bot 会在下次同步时整体写入
+        if (guilds := self.bot_guilds.get(bot_id)) is None:
+            return
+        guilds.add(guild_id)
+        self._link(bot_id, guild_id)
+
+    def discard(self, bot_id: str, guild_id: str):
+        if (guilds := self.bot_guilds.get(bot_id)) is not None:
+            guilds.discard(guild_id)
+        self._unlink(bot_id, guild_id)
+
+    def bots_in(self, guild_id: str) -> set[str]:
+        return self.guild_bots.get(guild_id) or set()
+
+    def guild_count(self, bot_id: str) -> int:
+        return len(self.bot_guilds.get(bot_id, ()))
+
+
+# adapter_name: GuildIndex
+indexes = defaultdict[str, GuildIndex](GuildIndex)
+
+
+def get_index(bot: BaseBot) -> GuildIndex:
+    return indexes[bot.adapter.get_name()]
@@ -1,36 +1,60 @@
 import asyncio
-import random
-from collections import defaultdict
 from collections.abc import Iterable
 from contextlib import suppress
+from functools import partial
 
+from cookit import with_semaphore
 from cookit.loguru import logged_suppress, warning_suppress
 from nonebot import get_bots, get_driver, logger
 from nonebot.adapters import Bot as BaseBot
 from nonebot_plugin_alconna.uniseg import Target
-from nonebot_plugin_uninfo import Interface, Scene, SceneType, Session, get_interface
-
-from ..uniapi.collectors import bot_guild_join_listener, guild_quitter
+from nonebot_plugin_uninfo import Scene, SceneType, Session
+
+from ..uniapi.collectors import (
+    bot_guild_join_listener,
+    bot_guild_quit_listener,
+    guild_quitter,
+)
+from ..uniapi.scene_cache import scene_cache
 from ..utils.common import call_limiter, extract_guild_scene
+from .config import config
+from .index import GuildIndex, get_index
+from .planner import plan
+from .quitter import quit_scheduler
 
 driver = get_driver()
 
 
-async def fetch_scenes(interface: Interface):
-    return [
-        *await interface.get_scenes(SceneType.GROUP),
-        *await interface.get_scenes(SceneType.GUILD),
-    ]
+async def sync_index(
+    index: GuildIndex,
+    bots: Iterable[BaseBot],
+    resync: bool = False,
+):
+    if not resync:
+        bots = [x for x in bots if x.self_id not in index]
+    else:
+        bots = list(bots)
+    if not bots:
+        return
+    scenes_ret = await asyncio.gather(*(scene_cache.get(b) for b in bots))
+    for bot, scenes in zip(bots, scenes_ret):
+        # 拉取失败时也会得到空结果，先不索引，下次同步时重试
+        if not scenes:
+            logger.debug(f"No scenes fetched for bot {bot.self_id}, skip indexing")
+            continue
+        index.set_bot(bot.self_id, scenes)
 
 
 async def safe_quit(bot: BaseBot, group_id: str):
     with warning_suppress("Failed to quit"):
         await guild_quitter.get_from_type_or_instance(bot)(bot, group_id)
+        scene_cache.discard(bot.self_id, group_id)
+        get_index(bot).discard(bot.self_id, group_id)
 
 
 async def quit_and_notice(
     guild_id: str,
-    quit_bots: Iterable[BaseBot],
+    quit_bots: list[BaseBot],
     notifier: BaseBot | None = None,
     notify_targets: Iterable[Target] | None = None,
 ):
@@ -45,85 +69,107 @@ async def quit_and_notice(
                     bot=notifier,
                 )
                 break
+    logger.info(
+        f"Quitting {' & '.join([x.self_id for x in quit_bots])} from {guild_id}",
+    )
     await asyncio.gather(*(safe_quit(b, guild_id) for b in quit_bots))
 
 
+def schedule_quit_and_notice(
+    guild_id: str,
+    quit_bots: Iterable[BaseBot],
+    notifier: BaseBot | None = None,
+    notify_targets: Iterable[Target] | None = None,
+) -> list[asyncio.Future[None]]:
+    # 提示由第一个退群任务在执行前发送
+    futures: list[asyncio.Future[None]] = []
+    for bot in quit_bots:
+        func = partial(quit_and_notice, guild_id, [bot], notifier, notify_targets)
+        futures.append(quit_scheduler.submit(bot.self_id, func))
+        notifier = None
+    return futures
+
+
 async def fetch_notify_targets(bot: BaseBot, scene: Scene) -> list[Target]:
     if scene.type <= SceneType.GROUP:
         return [Target.group(scene.id)]
 
-    if not (itf := get_interface(bot)):
-        logger.warning(f"Cannot get interface for bot {bot.self_id}")
+    children = await scene_cache.get_channels(bot, scene.id)
+    if not children:
         return []
+    return [Target.channel_(channel_id=x.id, guild_id=scene.id) for x in children]
 
-    with warning_suppress(
-        f"Failed to get bot {bot.self_id} guild {scene.id} channels",
-    ):
-        children = await itf.get_scenes(
-            SceneType.CHANNEL_TEXT,
-            parent_scene_id=scene.id,
-        )
-        return [Target.channel_(channel_id=x.id, guild_id=scene.id) for x in children]
 
-    return []
+async def fetch_guild_notify_targets(bot: BaseBot, guild_id: str) -> list[Target]:
+    if not (scene := scene_cache.get_scene(bot.self_id, guild_id)):
+        return []
+    return await fetch_notify_targets(bot, scene)
 
 
 quit_lock = asyncio.Lock()
 
 
-async def _bot_connect_quit(bots: dict[str, BaseBot]):
-    if len(bots) <= 1:
-        return
+async def _bot_connect_quit(bots: dict[str, BaseBot]) -> list[asyncio.Future[None]]:
+    """返回已安排的退群任务，调用方应在释放 quit_lock 后等待"""
 
-    scenes_ret = await asyncio.gather(
-        *(fetch_scenes(it) for b in bots.values() if (it := get_interface(b))),
-    )
-    bot_scenes = {k: {x.id: x for x in v} for k, v in zip(bots, scenes_ret) if v}
-    del scenes_ret
+    if not bots:
+        return []
 
-    if len(bot_scenes) <= 1:
-        return
+    index = get_index(next(iter(bots.values())))
+    if config.coordinate:
+        # 其他实例的 Bot 可能与本实例唯一的 Bot 重复，所以始终需要索引
+        # 规划由 coordination 统一进行
+        await sync_index(index, bots.values(), resync=True)
+        return []
 
-    # guild_id: set[bot_id]
-    guild_inner_bots = defaultdict[str, set[str]](set)
-    for bot_id, guilds in bot_scenes.items():
-        for guild in guilds:
-            guild_inner_bots[guild].add(bot_id)
+    if len(bots) <= 1:
+        return []
+    await sync_index(index, bots.values(), resync=True)
 
     # 群聊账号去重 使当前所有已连接 Bot 之间不存在相同群
-    # 退群规则: 优先退群总量多的
-
-    actions: list[tuple[str, list[BaseBot], BaseBot, list[Target]]] = []
-
-    for guild_id, bot_ids in guild_inner_bots.items():
-        if len(bot_ids) <= 1:
-            continue
-
-        bots_in_guild = [bots[x] for x in bot_ids]
-        bots_in_guild.sort(key=lambda x: len(bot_scenes[x.self_id]))
-
-        staying_bot = bots_in_guild.pop(0)
-        for bot in bots_in_guild:
-            del bot_scenes[bot.self_id][guild_id]
+    # 保留规则见 planner
+
+    guild_bots: dict[str, list[str]] = {}
+    for guild_id in index.duplicated:
+        bot_ids = [x for x in index.bots_in(guild_id) if x in bots]
+        if len(bot_ids) > 1:
+            guild_bots[guild_id] = bot_ids
+
+    keepers = plan(
+        guild_bots,
+        {x: index.guild_count(x) for x in bots},
+        config.plan_mode,
+    )
 
-        scene = bot_scenes[staying_bot.self_id][guild_id]
-        notify_targets = await fetch_notify_targets(staying_bot, scene)
+    fetch_targets = with_semaphore(
+        asyncio.Semaphore(config.notify_prefetch_concurrency),
+    )(fetch_guild_notify_targets)
+    notify_targets_ret = await asyncio.gather(
+        *(fetch_targets(bots[b], g) for g, b in keepers.items()),
+    )
 
+    actions: list[tuple[str, list[BaseBot], BaseBot, list[Target]]] = []
+    for (guild_id, staying_bot_id), notify_targets in zip(
+        keepers.items(),
+        notify_targets_ret,
+    ):
+        staying_bot = bots[staying_bot_id]
+        bots_in_guild = [bots[x] for x in guild_bots[guild_id] if x != staying_bot_id]
         actions.append((guild_id, bots_in_guild, staying_bot, notify_targets))
 
     logger.info(f"Collected {len(actions)} actions")
     if not actions:
-        return
+        return []
 
-    while True:
-        args = actions.pop(0)
-        logger.info(
-            f"Quitting {' & '.join([x.self_id for x in args[1]])} from {args[0]}",
+    futures: list[asyncio.Future[None]] = []
+    for args in actions:
+        logger.debug(
+            f"Scheduling {' & '.join([x.self_id for x in args[1]])}"
+            f" to quit from {args[0]}",
         )
-        await quit_and_notice(*args)
-        if not actions:
-            break
-        await asyncio.sleep(random.uniform(5, 10))
+        futures.extend(schedule_quit_and_notice(*args))
+    logger.info(f"Scheduled {quit_scheduler.total_depth} quits")
+    return futures
 
 
 def filter_same_adapter_bot(bot: BaseBot, should_filter: dict[str, BaseBot]):
@@ -133,13 +179,19 @@ def filter_same_adapter_bot(bot: BaseBot, should_filter: dict[str, BaseBot]):
     }
 
 
+@driver.on_bot_disconnect
+async def _(bot: BaseBot):
+    get_index(bot).remove_bot(bot.self_id)
+    quit_scheduler.cancel(bot.self_id)
+
+
 async def bot_connect_limiter_key_getter(bot: BaseBot):
     return bot.adapter.get_name()
 
 
 @driver.on_bot_disconnect
 @driver.on_bot_connect
-@call_limiter(bot_connect_limiter_key_getter)
+@call_limiter(bot_connect_limiter_key_getter, max_wait=30, join_running=True)
 async def _(bot: BaseBot):
     if not guild_quitter.supported(bot):
         logger.debug(f"{bot.adapter.get_name()} not supported")
@@ -151,7 +203,21 @@ async def _(bot: BaseBot):
         suppress(asyncio.CancelledError),
     ):
         async with quit_lock:
-            await _bot_connect_quit(bots)
+            futures = await _bot_connect_quit(bots)
+        # 不持有锁等待，避免阻塞入群处理
+        await asyncio.gather(*futures)
+
+
+@bot_guild_join_listener
+async def _(bot: BaseBot, ev: Session):
+    if scene := extract_guild_scene(ev):
+        get_index(bot).add(bot.self_id, scene.id)
+
+
+@bot_guild_quit_listener
+async def _(bot: BaseBot, ev: Session):
+    if scene := extract_guild_scene(ev):
+        get_index(bot).discard(bot.self_id, scene.id)
 
 
 async def guild_join_limiter_key_getter(bot: BaseBot, ev: Session):  # noqa: ARG001
@@ -161,38 +227,39 @@ async def guild_join_limiter_key_getter(bot: BaseBot, ev: Session):  # noqa: ARG
 
 
 @bot_guild_join_listener
-@call_limiter(guild_join_limiter_key_getter)
+@call_limiter(guild_join_limiter_key_getter, join_running=True)
 async def _(bot: BaseBot, ev: Session):
     if not guild_quitter.supported(bot):
         logger.debug(f"{bot.adapter.get_name()} not supported")
         return
 
     # 退出除被邀请 Bot 的所有本实例 Bot
+    # 多实例协同时交给主实例统一规划
+    if config.coordinate:
+        return
 
     async with quit_lock:
         bots = filter_same_adapter_bot(bot, get_bots())
         if bot.self_id not in bots:
             return
-        del bots[bot.self_id]
-        if len(bots) <= 1:
-            return
         scene = extract_guild_scene(ev)
         if not scene:
             return
 
-        scenes_ret = await asyncio.gather(
-            *(fetch_scenes(it) for b in bots.values() if (it := get_interface(b))),
-        )
-        bot_scenes = {k: {x.id: x for x in v} for k, v in zip(bots, scenes_ret) if v}
-        del scenes_ret
-
-        in_guild_other_bots = [bots[b] for b, s in bot_scenes.items() if scene.id in s]
+        # 一般情况下所有 Bot 都已在连接时索引，这里不会产生请求
+        index = get_index(bot)
+        await sync_index(index, bots.values())
+        in_guild_other_bots = [
+            bots[x] for x in index.bots_in(scene.id) if x != bot.self_id and x in bots
+        ]
         if not in_guild_other_bots:
             return
 
-        await quit_and_notice(
+        futures = schedule_quit_and_notice(
             scene.id,
             in_guild_other_bots,
             bot,
             await fetch_notify_targets(bot, scene),
         )
+    # 监听器超时被取消时已安排的退群不受影响
+    await asyncio.gather(*(asyncio.shield(x) for x in futures))
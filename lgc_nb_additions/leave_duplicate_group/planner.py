@@ -0,0 +1,77 @@
+import enum
+from collections.abc import Collection, Mapping
+
+
+class PlanMode(enum.StrEnum):
+    BALANCED = "balanced"
+    GREEDY = "greedy"
+
+
+def plan_greedy(
+    guild_bots: Mapping[str, Collection[str]],
+    bot_guild_counts: Mapping[str, int],
+) -> dict[str, str]:
+    # 逐个群保留当前群数最少的 Bot，其余 Bot 的群数随之减少
+    counts = dict(bot_guild_counts)
+    keepers: dict[str, str] = {}
+    for guild_id in sorted(guild_bots):
+        bot_ids = sorted(guild_bots[guild_id], key=lambda x: (counts[x], x))
+        keepers[guild_id] = bot_ids[0]
+        for bot_id in bot_ids[1:]:
+            counts[bot_id] -= 1
+    return keepers
+
+
+def plan_balanced(
+    guild_bots: Mapping[str, Collection[str]],
+    bot_guild_counts: Mapping[str, int],
+) -> dict[str, str]:
+    # 每个重复群必须且只能保留一个 Bot，所以总退群次数恒为 sum(len(bots) - 1)，
+    # 能优化的只有保留后各 Bot 群数的均衡程度
+
+    # 只在一个 Bot 中的群不可调整，先算作固定负载
+    loads = dict(bot_guild_counts)
+    for bot_ids in guild_bots.values():
+        for bot_id in bot_ids:
+            loads[bot_id] -= 1
+
+    # 候选 Bot 越少的群越先分配，每次分给当前负载最低的 Bot
+    keepers: dict[str, str] = {}
+    owned: dict[str, set[str]] = {x: set() for x in loads}
+    for guild_id in sorted(guild_bots, key=lambda x: (len(guild_bots[x]), x)):
+        bot_id = min(guild_bots[guild_id], key=lambda x: (loads[x], x))
+        keepers[guild_id] = bot_id
+        owned[bot_id].add(guild_id)
+        loads[bot_id] += 1
+
+    # 把群从负载高的 Bot 挪给负载至少低 2 的候选 Bot，直到无法再改善
+    # 每次移动都会严格减小负载平方和，因此必然终止
+    moved = True
+    while moved:
+        moved = False
+        for donor in sorted(loads, key=lambda x: (-loads[x], x)):
+            for guild_id in sorted(owned[donor]):
+                target = min(guild_bots[guild_id], key=lambda x: (loads[x], x))
+                if loads[target] + 1 >= loads[donor]:
+                    continue
+                owned[donor].remove(guild_id)
+                owned[target].add(guild_id)
+                keepers[guild_id] = target
+                loads[donor] -= 1
+                loads[target] += 1
+                moved = True
+
+    return keepers
+
+
+def plan(
+    guild_bots: Mapping[str, Collection[str]],
+    bot_guild_counts: Mapping[str, int],
+    mode: PlanMode = PlanMode.BALANCED,
+) -> dict[str, str]:
+    """根据重复群的 Bot 列表 (guild_id: bot_ids) 与各 Bot 的总群数，
+    计算每个重复群应保留的 Bot，返回 guild_id: bot_id"""
+
+    if mode is PlanMode.GREEDY:
+        return plan_greedy(guild_bots, bot_guild_counts)
+    return plan_balanced(guild_bots, bot_guild_counts)
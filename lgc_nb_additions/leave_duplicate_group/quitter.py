@@ -0,0 +1,101 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from cookit.loguru import logged_suppress
+
+from .config import config
+
+type QuitJob = tuple[Callable[[], Awaitable[Any]], asyncio.Future[None]]
+
+
+class TokenBucket:
+    def __init__(self, burst: int, rate: float) -> None:
+        self.burst = burst
+        self.rate = rate  # 每秒恢复的令牌数
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst,
+            self.tokens + (now - self.updated_at) * self.rate,
+        )
+        self.updated_at = now
+
+    async def acquire(self):
+        while True:
+            self.refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class QuitScheduler:
+    """每个 Bot 各自一条队列与令牌桶，不同 Bot 的退群操作并行执行"""
+
+    def __init__(self, burst: int, rate: float) -> None:
+        self.burst = burst
+        self.rate = rate
+        self.queues: dict[str, asyncio.Queue[QuitJob]] = {}
+        self.buckets: dict[str, TokenBucket] = {}
+        self.workers: dict[str, asyncio.Task[None]] = {}
+
+    def depth(self, bot_id: str) -> int:
+        return q.qsize() if (q := self.queues.get(bot_id)) else 0
+
+    @property
+    def total_depth(self) -> int:
+        return sum(q.qsize() for q in self.queues.values())
+
+    def submit(
+        self,
+        bot_id: str,
+        func: Callable[[], Awaitable[Any]],
+    ) -> asyncio.Future[None]:
+        """返回的 Future 被取消时，尚未执行的任务会被跳过；任务出错时只记录日志"""
+
+        future = asyncio.get_running_loop().create_future()
+        if not (queue := self.queues.get(bot_id)):
+            queue = self.queues[bot_id] = asyncio.Queue()
+        queue.put_nowait((func, future))
+        if bot_id not in self.workers:
+            self.workers[bot_id] = asyncio.create_task(self._work(bot_id, queue))
+        return future
+
+    def cancel(self, bot_id: str):
+        if worker := self.workers.get(bot_id):
+            worker.cancel()
+
+    async def _work(self, bot_id: str, queue: asyncio.Queue[QuitJob]):
+        bucket = self.buckets.get(bot_id)
+        if not bucket:
+            bucket = self.buckets[bot_id] = TokenBucket(self.burst, self.rate)
+
+        future: asyncio.Future[None] | None = None
+        try:
+            while not queue.empty():
+                func, future = queue.get_nowait()
+                if future.done():
+                    continue
+                await bucket.acquire()
+                if future.done():
+                    continue
+                # 出错时只记录日志，Future 照常完成，不影响队列中的后续任务
+                with logged_suppress(f"Failed to run quit task of bot {bot_id}"):
+                    await func()
+                if not future.done():
+                    future.set_result(None)
+        finally:
+            if future and not future.done():
+                future.cancel()
+            while not queue.empty():
+                queue.get_nowait()[1].cancel()
+            del self.workers[bot_id]
+            del self.queues[bot_id]
+
+
+quit_scheduler = QuitScheduler(config.quit_burst, config.quit_rate / 60)
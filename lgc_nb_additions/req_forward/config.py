@@ -6,7 +6,29 @@ from nonebot import get_plugin_config, logger
 from nonebot_plugin_alconna.uniseg import Target
 from pydantic import AfterValidator, BaseModel, Field
 
-from ..utils.common import parse_target, target_validator
+from ..utils.common import parse_target
+from .policy import PolicyRule
+
+type TargetsConfig = str | list[str | list[str]] | None
+
+
+def normalize_targets(v: TargetsConfig) -> list[list[str]]:
+    """列表中每一项均会发送，某项为列表时按顺序发送到第一个成功的目标"""
+
+    if not v:
+        return []
+    if isinstance(v, str):
+        return [[v]]
+    return [[x] if isinstance(x, str) else x for x in v]
+
+
+def targets_validator(v: TargetsConfig) -> TargetsConfig:
+    for chain in normalize_targets(v):
+        if not chain:
+            raise ValueError("Empty target list")
+        for x in chain:
+            parse_target(x)
+    return v
 
 
 @model_with_alias_generator(lambda x: f"lgc_req_forward_{x}")
@@ -16,14 +38,35 @@ class ConfigModel(BaseModel):
         alias="alconna_apply_fetch_targets",
     )
 
-    target: Annotated[str | None, AfterValidator(target_validator)] = None
+    # 每个 Bot 同时处理请求的数量
+    process_concurrency: int = Field(default=3, ge=1)
+    # 单个请求调用 Bot API 处理的超时，单位秒
+    process_timeout: float = Field(default=60, gt=0)
+
+    # 自动处理规则，按顺序匹配，匹配到的请求不再转发审核
+    policy_rules: list[PolicyRule] = Field(default_factory=list)
+
+    target: Annotated[TargetsConfig, AfterValidator(targets_validator)] = None
+    # 单个目标的发送超时，单位秒
+    send_timeout: float = Field(default=15, gt=0)
+    # 合并通知，收集 digest_window 秒或 digest_max_items 条请求后合并发送
+    digest: bool = False
+    digest_window: float = Field(default=30, gt=0)
+    digest_max_items: int = Field(default=20, ge=1)
+
+    # 延迟写入新请求，每隔 write_behind_interval 秒或攒够 write_behind_max_rows 条写入一次
+    # 请求写入后才会转发，所以每个请求的处理会多出最多 write_behind_interval 秒的延迟，
+    # 只减少数据库事务数量，不降低单个请求的延迟
+    write_behind: bool = False
+    write_behind_interval: float = Field(default=0.2, gt=0)
+    write_behind_max_rows: int = Field(default=50, ge=1)
 
     @cached_property
-    def parsed_target(self) -> Target | None:
-        return parse_target(self.target) if self.target else None
+    def parsed_targets(self) -> list[list[Target]]:
+        return [[parse_target(x) for x in c] for c in normalize_targets(self.target)]
 
 
 config: ConfigModel = get_plugin_config(ConfigModel)
 
-if not config.parsed_target:
+if not config.parsed_targets:
     logger.warning("Target unset, plugin will not work")
@@ -3,17 +3,22 @@ import random
 import string
 from datetime import UTC, datetime, timedelta
 
-from nonebot_plugin_orm import Model
-from sqlalchemy import String
+from nonebot import logger
+from nonebot_plugin_apscheduler import scheduler
+from nonebot_plugin_orm import Model, get_session
+from sqlalchemy import ColumnElement, Index, String, and_, delete, or_, select
 from sqlalchemy.orm import Mapped, mapped_column
 
 EXPIRE_TIME = timedelta(minutes=30)
 EXPIRE_TIME_STR = "30 分钟"
+PURGE_BATCH_SIZE = 500
 
 
 class RequestStatus(enum.StrEnum):
     PENDING = "pending"
+    CONFIRMING = "confirming"
     CONFIRMED = "confirmed"
+    REJECTED = "rejected"
 
 
 class RequestType(enum.StrEnum):
@@ -21,12 +26,54 @@ class RequestType(enum.StrEnum):
     GUILD_INVITE = "guild_invite"
 
 
-def generate_request_id() -> str:
-    return "".join(random.sample(string.ascii_letters + string.digits, k=8))
+# 请求 ID 由 6 位时间（自 REQUEST_ID_EPOCH 起的秒数）与 2 位随机字符组成，
+# 按字典序排序即按创建时间排序；只用小写字母，不受数据库大小写排序规则影响
+# 旧版本生成的 8 位随机 ID 依然有效，但不参与时间排序
+# ID 只用于让批量处理等列表按创建时间排列，不用于按时间范围查询：
+# 请求刷新后会延后过期，所以过期清理仍按 (status, modified_at) 索引查询
+REQUEST_ID_EPOCH = datetime(2024, 1, 1, tzinfo=UTC)
+REQUEST_ID_ALPHABET = string.digits + string.ascii_lowercase
+REQUEST_ID_TIME_LEN = 6
+REQUEST_ID_RANDOM_LEN = 2
+
+
+def encode_request_id_time(timestamp: float) -> str:
+    base = len(REQUEST_ID_ALPHABET)
+    n = min(
+        max(int(timestamp - REQUEST_ID_EPOCH.timestamp()), 0),
+        base**REQUEST_ID_TIME_LEN - 1,
+    )
+    chars: list[str] = []
+    for _ in range(REQUEST_ID_TIME_LEN):
+        n, r = divmod(n, base)
+        chars.append(REQUEST_ID_ALPHABET[r])
+    return "".join(reversed(chars))
+
+
+def generate_request_id(timestamp: float | None = None) -> str:
+    if timestamp is None:
+        timestamp = datetime.now(UTC).timestamp()
+    return encode_request_id_time(timestamp) + "".join(
+        random.choices(REQUEST_ID_ALPHABET, k=REQUEST_ID_RANDOM_LEN),
+    )
 
 
 class RequestInfo(Model):
     __tablename__ = "lgc_req_forward_request_info"
+    __table_args__ = (
+        Index(
+            "ix_lgc_req_forward_request_info_status_modified_at",
+            "status",
+            "modified_at",
+        ),
+        Index(
+            "ix_lgc_req_forward_request_info_bot_id_type_identifier",
+            "bot_id",
+            "type",
+            "identifier",
+            unique=True,
+        ),
+    )
 
     id: Mapped[str] = mapped_column(
         String(8),
@@ -42,23 +89,54 @@ class RequestInfo(Model):
         default=lambda: datetime.now(UTC).timestamp(),
         onupdate=lambda: datetime.now(UTC).timestamp(),
     )
+    # 被标记为处理中的时间，用于恢复崩溃后遗留的请求
+    claimed_at: Mapped[float | None] = mapped_column(default=None)
 
 
-def is_expired(info: RequestInfo):
-    modified = datetime.fromtimestamp(info.modified_at, tz=UTC)
-    return (datetime.now(UTC) - modified) > EXPIRE_TIME
+def expire_before() -> float:
+    return (datetime.now(UTC) - EXPIRE_TIME).timestamp()
 
 
-# async def clear_expired_data():
-#     logger.info("Cleaning expired requests...")
-#     async with get_session() as ss, ss.begin() as tr:
-#         result = await ss.execute(
-#             delete(RequestInfo).where(
-#                 (datetime.now(UTC) - RequestInfo.modified_at) > EXPIRE_TIME,
-#             ),
-#         )
-#         await tr.commit()
-#     logger.success(f"{result.rowcount} rows affected")
+def is_pending() -> ColumnElement[bool]:
+    return and_(
+        RequestInfo.status == RequestStatus.PENDING,
+        RequestInfo.modified_at >= expire_before(),
+    )
+
+
+def is_purgeable() -> ColumnElement[bool]:
+    return or_(
+        RequestInfo.status.in_((RequestStatus.CONFIRMED, RequestStatus.REJECTED)),
+        and_(
+            RequestInfo.status == RequestStatus.PENDING,
+            RequestInfo.modified_at < expire_before(),
+        ),
+    )
 
 
-# scheduler.add_job(clear_expired_data, trigger="interval", minutes=15)
+async def clear_expired_data():
+    logger.debug("Cleaning expired requests...")
+    affected = 0
+    while True:
+        async with get_session() as ss, ss.begin():
+            ids = (
+                await ss.scalars(
+                    select(RequestInfo.id)
+                    .where(is_purgeable())
+                    .limit(PURGE_BATCH_SIZE),
+                )
+            ).all()
+            if ids:
+                await ss.execute(delete(RequestInfo).where(RequestInfo.id.in_(ids)))
+        affected += len(ids)
+        if len(ids) < PURGE_BATCH_SIZE:
+            break
+
+    log_msg = f"Cleaned {affected} expired requests"
+    if affected:
+        logger.info(log_msg)
+    else:
+        logger.debug(log_msg)
+
+
+scheduler.add_job(clear_expired_data, trigger="interval", minutes=15)
@@ -0,0 +1,274 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import NamedTuple
+
+from nonebot import get_driver, logger
+from nonebot_plugin_orm import get_session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import config
+from .db import (
+    RequestInfo,
+    RequestStatus,
+    RequestType,
+    expire_before,
+    generate_request_id,
+)
+
+driver = get_driver()
+
+REQUEST_ID_ATTEMPTS = 16
+WRITE_BEHIND_ATTEMPTS = 3
+
+
+class IngestResult(NamedTuple):
+    id: str
+    # 新请求或之前的请求已过期，需要重新通知
+    notify: bool
+
+
+@dataclass
+class BufferedRequest:
+    info: RequestInfo
+    future: asyncio.Future[IngestResult]
+    attempts: int = 0
+
+
+class RequestWriteBuffer:
+    """攒一批新请求后在同一个事务中写入
+
+    请求写入后才会得到结果，与已有请求冲突时使用已有请求的 ID"""
+
+    def __init__(self, interval: float, max_rows: int) -> None:
+        self.interval = interval
+        self.max_rows = max_rows
+        self.entries: list[BufferedRequest] = []
+        self.lock = asyncio.Lock()
+        self.timer: asyncio.Task[None] | None = None
+        self.tasks: set[asyncio.Task[None]] = set()
+
+    def add(self, info: RequestInfo) -> asyncio.Future[IngestResult]:
+        future = asyncio.get_running_loop().create_future()
+        self.entries.append(BufferedRequest(info, future))
+        self.schedule()
+        return future
+
+    def schedule(self):
+        if len(self.entries) >= self.max_rows:
+            task = asyncio.create_task(self.flush())
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        elif not self.timer:
+            self.timer = asyncio.create_task(self.flush_later())
+
+    async def flush_later(self):
+        try:
+            await asyncio.sleep(self.interval)
+        finally:
+            self.timer = None
+        await self.flush()
+
+    async def write(self, entries: list[BufferedRequest]) -> list[IngestResult]:
+        identifiers = {x.info.identifier for x in entries}
+        ids = [x.info.id for x in entries]
+        async with get_session() as ss, ss.begin():
+            # 一次查询出所有可能冲突的已有请求与 ID
+            existing = {
+                (x.bot_id, x.type, x.identifier): x
+                for x in await ss.scalars(
+                    select(RequestInfo).where(RequestInfo.identifier.in_(identifiers)),
+                )
+            }
+            taken_ids = set(
+                await ss.scalars(select(RequestInfo.id).where(RequestInfo.id.in_(ids))),
+            )
+
+            now = datetime.now(UTC).timestamp()
+            # 同一批中的相同请求
+            added: dict[tuple[str, RequestType, str], RequestInfo] = {}
+            rows: list[tuple[RequestInfo, bool]] = []
+            # 重新生成了 ID 的新请求，需要再查询一次是否已被占用
+            unchecked: list[RequestInfo] = []
+            for entry in entries:
+                info = entry.info
+                key = (info.bot_id, info.type, info.identifier)
+                if row := added.get(key):
+                    rows.append((row, False))
+                elif row := existing.get(key):
+                    notify = False
+                    if row.status is RequestStatus.PENDING:
+                        notify = row.modified_at < expire_before()
+                        row.modified_at = now
+                    rows.append((row, notify))
+                else:
+                    if info.id in taken_ids:
+                        while info.id in taken_ids:
+                            info.id = generate_request_id()
+                        unchecked.append(info)
+                    taken_ids.add(info.id)
+                    added[key] = info
+                    rows.append((info, True))
+
+            for _ in range(REQUEST_ID_ATTEMPTS):
+                if not unchecked:
+                    break
+                taken = set(
+                    await ss.scalars(
+                        select(RequestInfo.id).where(
+                            RequestInfo.id.in_([x.id for x in unchecked]),
+                        ),
+                    ),
+                )
+                unchecked = [x for x in unchecked if x.id in taken]
+                taken_ids.update(taken)
+                for info in unchecked:
+                    while info.id in taken_ids:
+                        info.id = generate_request_id()
+                    taken_ids.add(info.id)
+            else:
+                raise RuntimeError("Failed to generate an unused request id")
+
+            ss.add_all(added.values())
+        return [IngestResult(row.id, notify=notify) for row, notify in rows]
+
+    async def flush(self):
+        async with self.lock:
+            entries = [x for x in self.entries if not x.future.done()]
+            self.entries = []
+            if not entries:
+                return
+            try:
+                results = await self.write(entries)
+            except SQLAlchemyError as e:
+                # 可能是其他实例同时写入了相同请求，重试时会查询到
+                retry: list[BufferedRequest] = []
+                for entry in entries:
+                    entry.attempts += 1
+                    if entry.attempts < WRITE_BEHIND_ATTEMPTS:
+                        retry.append(entry)
+                    else:
+                        entry.future.set_exception(e)
+                if retry:
+                    logger.opt(exception=e).warning(
+                        f"Failed to write {len(entries)} requests,"
+                        f" retrying {len(retry)} of them",
+                    )
+                    self.entries[:0] = retry
+                    self.schedule()
+                else:
+                    logger.opt(exception=e).error(
+                        f"Failed to write {len(entries)} requests",
+                    )
+                return
+            except Exception as e:
+                for entry in entries:
+                    if not entry.future.done():
+                        entry.future.set_exception(e)
+                raise
+
+        for entry, result in zip(entries, results):
+            if not entry.future.done():
+                entry.future.set_result(result)
+        logger.debug(f"Wrote {len(entries)} requests")
+
+
+write_buffer = RequestWriteBuffer(
+    config.write_behind_interval,
+    config.write_behind_max_rows,
+)
+
+
+async def find_request(
+    ss: AsyncSession,
+    bot_id: str,
+    type_: RequestType,
+    identifier: str,
+) -> RequestInfo | None:
+    return await ss.scalar(
+        select(RequestInfo).where(
+            RequestInfo.bot_id == bot_id,
+            RequestInfo.type == type_,
+            RequestInfo.identifier == identifier,
+        ),
+    )
+
+
+async def refresh_request(
+    bot_id: str,
+    type_: RequestType,
+    identifier: str,
+) -> IngestResult | None:
+    """已有相同请求时刷新其修改时间并复用 ID"""
+
+    async with get_session() as ss, ss.begin():
+        if not (info := await find_request(ss, bot_id, type_, identifier)):
+            return None
+        if info.status is not RequestStatus.PENDING:
+            return IngestResult(info.id, notify=False)
+        expired = info.modified_at < expire_before()
+        info.modified_at = datetime.now(UTC).timestamp()
+        return IngestResult(info.id, notify=expired)
+
+
+def unused_request_id() -> str:
+    """生成未被写入缓冲中请求占用的 ID，与数据库中的冲突在写入时处理"""
+
+    buffered = {x.info.id for x in write_buffer.entries}
+    for _ in range(REQUEST_ID_ATTEMPTS):
+        if (rid := generate_request_id()) not in buffered:
+            return rid
+    raise RuntimeError("Failed to generate an unused request id")
+
+
+async def add_request(
+    type_: RequestType,
+    bot_id: str,
+    user_id: str,
+    identifier: str,
+) -> IngestResult:
+    """写入请求并返回请求 ID，开启延迟写入时等待所在批次写入后返回
+
+    同一 Bot 重复收到的相同请求不会产生新记录"""
+
+    if config.write_behind:
+        # 已有请求与 ID 冲突在写入时按批查询处理，不单独访问数据库
+        info = RequestInfo(
+            id=unused_request_id(),
+            type=type_,
+            bot_id=bot_id,
+            user_id=user_id,
+            identifier=identifier,
+        )
+        # 调用方被取消时请求依然写入
+        return await asyncio.shield(write_buffer.add(info))
+
+    if result := await refresh_request(bot_id, type_, identifier):
+        return result
+
+    for _ in range(REQUEST_ID_ATTEMPTS):
+        info = RequestInfo(
+            id=unused_request_id(),
+            type=type_,
+            bot_id=bot_id,
+            user_id=user_id,
+            identifier=identifier,
+        )
+        try:
+            async with get_session() as ss, ss.begin():
+                ss.add(info)
+        except IntegrityError:
+            # 并发收到的相同请求已经先写入
+            if result := await refresh_request(bot_id, type_, identifier):
+                return IngestResult(result.id, notify=False)
+            # 否则是 ID 已被占用，换一个重试
+            continue
+        return IngestResult(info.id, notify=True)
+    raise RuntimeError("Failed to write request")
+
+
+@driver.on_shutdown
+async def _():
+    await write_buffer.flush()
@@ -1,35 +1,62 @@
-from arclet.alconna import Alconna, Arg, Args, CommandMeta
-from nonebot import get_bot, logger
+from typing import Any
+
+from arclet.alconna import Alconna, Arg, Args, CommandMeta, MultiVar, Option
+from nonebot import logger
 from nonebot.adapters import Bot as BaseBot, Event as BaseEvent
 from nonebot.permission import SUPERUSER
 from nonebot_plugin_alconna import Query, UniMessage, on_alconna
-from nonebot_plugin_orm import async_scoped_session, get_session
+from nonebot_plugin_orm import get_session
 from nonebot_plugin_uninfo import Uninfo
+from sqlalchemy import select
 
 from ..uniapi.collectors import (
     FriendRequestData,
     GuildInviteRequestData,
     friend_request_listener,
-    friend_request_processor,
     guild_invite_request_listener,
-    guild_invite_request_processor,
 )
-from ..utils.common import extract_guild_scene, get_bot_for_target
+from ..utils.common import extract_guild_scene
 from .config import config
 from .db import (
-    EXPIRE_TIME_STR,
     RequestInfo,
-    RequestStatus,
     RequestType,
-    generate_request_id,
-    is_expired,
+    is_pending,
+)
+from .ingest import add_request, write_buffer
+from .notify import RequestNotice, notify_request
+from .policy import PolicyAction, RequestFacts, RequestPolicy
+from .process import (
+    ProcessResult,
+    RequestClaimedError,
+    call_processor,
+    is_processed,
+    process_requests,
 )
 
+request_policy = RequestPolicy(config.policy_rules)
+
 alc = Alconna(
     "confirm-req",
     Args(
-        Arg("req_id", str, notice="请求ID"),
+        Arg("req_ids", MultiVar(str, "*"), notice="请求ID"),
+    ),
+    Option("-a|--all", help_text="选择所有未处理的请求"),
+    Option(
+        "-u|--user",
+        Args(Arg("user_id", str, notice="用户ID")),
+        help_text="只选择该用户的请求",
+    ),
+    Option(
+        "-b|--bot",
+        Args(Arg("bot_id", str, notice="Bot ID")),
+        help_text="只选择该 Bot 收到的请求",
+    ),
+    Option(
+        "-t|--type",
+        Args(Arg("req_type", str, notice="friend / guild_invite")),
+        help_text="只选择该类型的请求",
     ),
+    Option("-r|--reject", help_text="拒绝请求"),
     meta=CommandMeta(description="请求转发"),
 )
 confirm_req = on_alconna(
@@ -40,85 +67,169 @@ confirm_req = on_alconna(
 )
 
 
+def build_summary(
+    reqs: list[RequestInfo],
+    results: list[ProcessResult],
+    action: str,
+    denied: int,
+) -> str:
+    if len(reqs) == 1 and not denied:
+        result = results[0]
+        if isinstance(result, RequestClaimedError):
+            return "该请求正在被处理或已处理"
+        if isinstance(result, Exception):
+            return f"请求{action}失败，请联系维护者"
+        status_msg = {
+            True: f"请求已{action}",
+            False: f"请求{action}失败",
+            None: (
+                f"已执行{action}操作，是否成功{action}请自行留意，"
+                f"如未{action}请尝试重新操作，或联系维护者"
+            ),
+        }
+        return status_msg[result]
+
+    succeeded = sum(x is True for x in results)
+    unknown = sum(x is None for x in results)
+    claimed = sum(isinstance(x, RequestClaimedError) for x in results)
+    failed = [
+        r.id
+        for r, x in zip(reqs, results)
+        if not (is_processed(x) or isinstance(x, RequestClaimedError))
+    ]
+    lines = [f"已对 {len(reqs)} 个请求执行{action}操作"]
+    if succeeded:
+        lines.append(f"成功 {succeeded} 个")
+    if unknown:
+        lines.append(f"结果未知 {unknown} 个，请自行留意")
+    if failed:
+        lines.append(f"失败 {len(failed)} 个：{' '.join(failed)}")
+    if claimed:
+        lines.append(f"已被其他操作处理 {claimed} 个")
+    if denied:
+        lines.append(f"另有 {denied} 个请求无权操作，已跳过")
+    return "\n".join(lines)
+
+
 @confirm_req.handle()
 async def _(
     bot: BaseBot,
     ev: Uninfo,
     raw_ev: BaseEvent,
-    ss: async_scoped_session,
-    q_req_id: Query[str] = Query("~req_id"),
+    q_req_ids: Query[tuple[str, ...]] = Query("~req_ids", ()),
+    q_all: Query[Any] = Query("all"),
+    q_user: Query[str] = Query("user.user_id"),
+    q_bot: Query[str] = Query("bot.bot_id"),
+    q_type: Query[str] = Query("type.req_type"),
+    q_reject: Query[Any] = Query("reject"),
 ):
-    async with ss.begin():
-        req = await ss.get(RequestInfo, q_req_id.result)
-        if (not req) or (req.status is RequestStatus.CONFIRMED) or is_expired(req):
-            await UniMessage.text("未找到该请求").finish(reply_to=True)
-
-        if req.user_id != ev.user.id and not await SUPERUSER(bot, raw_ev):
-            await UniMessage.text("你无权操作此请求").finish(reply_to=True)
-
-        try:
-            bot = get_bot(req.bot_id)
-            if req.type == RequestType.FRIEND:
-                confirm_status = (
-                    await friend_request_processor.get_from_type_or_instance(bot)(
-                        bot,
-                        req.identifier,
-                        approve=True,
-                    )
-                )
-            else:
-                confirm_status = (
-                    await guild_invite_request_processor.get_from_type_or_instance(bot)(
-                        bot,
-                        req.identifier,
-                        approve=True,
-                    )
+    req_ids = q_req_ids.result
+    use_filter = q_all.available or q_user.available or q_bot.available
+    use_filter = use_filter or q_type.available
+    if not (req_ids or use_filter):
+        await UniMessage.text("请提供请求ID，或使用 --all 选择所有请求").finish(
+            reply_to=True,
+        )
+
+    conditions = [is_pending()]
+    if req_ids:
+        conditions.append(RequestInfo.id.in_(req_ids))
+    if q_user.available:
+        conditions.append(RequestInfo.user_id == q_user.result)
+    if q_bot.available:
+        conditions.append(RequestInfo.bot_id == q_bot.result)
+    if q_type.available:
+        if q_type.result not in RequestType:
+            await UniMessage.text("未知的请求类型").finish(reply_to=True)
+        conditions.append(RequestInfo.type == RequestType(q_type.result))
+
+    is_superuser = await SUPERUSER(bot, raw_ev)
+    if (not is_superuser) and (not req_ids):
+        # 非超管只能筛选到自己的请求
+        conditions.append(RequestInfo.user_id == ev.user.id)
+
+    approve = not q_reject.available
+    action = "通过" if approve else "拒绝"
+
+    # 确保刚收到的请求已写入
+    await write_buffer.flush()
+    # 只在短事务中读取与更新状态，调用 Bot API 时不持有事务
+    async with get_session() as ss:
+        reqs = list(
+            (
+                await ss.scalars(
+                    select(RequestInfo).where(*conditions).order_by(RequestInfo.id),
                 )
-        except Exception:
-            logger.exception("Failed to confirm req")
-            await UniMessage.text("请求确认失败，请联系维护者").finish(reply_to=True)
+            ).all(),
+        )
+    if not reqs:
+        await UniMessage.text("未找到该请求").finish(reply_to=True)
+
+    allowed = [x for x in reqs if is_superuser or x.user_id == ev.user.id]
+    denied = len(reqs) - len(allowed)
+    if not allowed:
+        await UniMessage.text("你无权操作此请求").finish(reply_to=True)
+
+    results = await process_requests(allowed, approve)
+
+    await UniMessage.text(build_summary(allowed, results, action, denied)).finish(
+        reply_to=True,
+    )
+
 
-        if confirm_status is not False:
-            req.status = RequestStatus.CONFIRMED
-            await ss.commit()
+async def apply_policy(bot: BaseBot, facts: RequestFacts, identifier: str) -> bool:
+    """按自动处理规则直接处理请求，返回 False 时转人工审核"""
 
-    status_msg = {
-        True: "请求已通过",
-        False: "请求通过失败",
-        None: "已执行通过操作，是否成功通过请自行留意，如未通过请尝试重新操作，或联系维护者",
-    }
-    await UniMessage.text(status_msg[confirm_status]).finish(reply_to=True)
+    decision = request_policy.evaluate(facts)
+    if (decision.action is PolicyAction.REVIEW) or (not decision.rule):
+        return False
+
+    try:
+        result = await call_processor(
+            bot,
+            facts.type,
+            identifier,
+            approve=decision.action is PolicyAction.APPROVE,
+        )
+    except Exception:
+        logger.exception(f"Failed to auto {decision.action} request {identifier}")
+        result = False
+    if result is False:
+        # 平台上未实际处理（如可疑好友请求无法拒绝），不占用配额并转人工审核
+        request_policy.release(decision, facts.bot_id)
+        logger.info(
+            f"{facts.type} request {identifier} was not handled by policy rule"
+            f" #{decision.rule.index}, falling back to review",
+        )
+        return False
+
+    logger.info(
+        f"{facts.type} request {identifier} handled by policy rule"
+        f" #{decision.rule.index}, action: {decision.action}",
+    )
+    return True
 
 
 @friend_request_listener
 async def _(bot: BaseBot, data: FriendRequestData):
     uid = data.session.user.id
-    async with get_session() as ss:
-        rid = generate_request_id()
-        ss.add(
-            RequestInfo(
-                id=rid,
-                type=RequestType.FRIEND,
-                bot_id=bot.self_id,
-                user_id=uid,
-                identifier=data.identifier,
-            ),
-        )
-        await ss.commit()
+    facts = RequestFacts(RequestType.FRIEND, bot.self_id, uid, doubt=data.doubt)
+    if await apply_policy(bot, facts, data.identifier):
+        return
+
+    rid, notify = await add_request(
+        RequestType.FRIEND,
+        bot.self_id,
+        uid,
+        data.identifier,
+    )
 
     logger.info(
         f"Friend request from {uid}, identifier: {data.identifier}, request id: {rid}",
     )
-    if config.parsed_target:
-        await config.parsed_target.send(
-            UniMessage.text("收到来自 ")
-            .at(uid)
-            .text(
-                f" 的好友请求，请您在 {EXPIRE_TIME_STR} 内发送以下内容自行操作："
-                f"\nconfirm-req {rid}",
-            ),
-            bot=await get_bot_for_target(config.parsed_target),
-        )
+    if not notify:
+        return
+    notify_request(RequestNotice(rid, RequestType.FRIEND, uid))
 
 
 @guild_invite_request_listener
@@ -128,32 +239,22 @@ async def _(bot: BaseBot, data: GuildInviteRequestData):
         return
 
     uid = data.session.user.id
-    async with get_session() as ss, ss.begin() as t:
-        rid = generate_request_id()
-        ss.add(
-            RequestInfo(
-                id=rid,
-                type=RequestType.GUILD_INVITE,
-                bot_id=bot.self_id,
-                user_id=uid,
-                identifier=data.identifier,
-            ),
-        )
-        await t.commit()
+    facts = RequestFacts(RequestType.GUILD_INVITE, bot.self_id, uid, scene.id)
+    if await apply_policy(bot, facts, data.identifier):
+        return
+
+    rid, notify = await add_request(
+        RequestType.GUILD_INVITE,
+        bot.self_id,
+        uid,
+        data.identifier,
+    )
 
     logger.info(
         f"Guild invite request to {scene.id} from {uid}"
         f", identifier: {data.identifier}"
         f", request id: {rid}",
     )
-    if config.parsed_target:
-        await config.parsed_target.send(
-            UniMessage.text("收到来自 ")
-            .at(uid)
-            .text(
-                f" 的邀群请求 ({scene.id[0]}...{scene.id[-1]})"
-                f"，请您在 {EXPIRE_TIME_STR} 内发送以下内容自行操作：\n"
-                f"confirm-req {rid}",
-            ),
-            bot=await get_bot_for_target(config.parsed_target),
-        )
+    if not notify:
+        return
+    notify_request(RequestNotice(rid, RequestType.GUILD_INVITE, uid, scene.id))
@@ -0,0 +1,69 @@
+"""rejected status
+
+迁移 ID: 5a8f0c7e1d93
+父迁移: 7d3e9a41c2b8
+创建时间: 2026-10-18 23:05:31.684207
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "5a8f0c7e1d93"
+down_revision: str | Sequence[str] | None = "7d3e9a41c2b8"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+OLD_STATUS = sa.Enum("PENDING", "CONFIRMING", "CONFIRMED", name="requeststatus")
+NEW_STATUS = sa.Enum(
+    "PENDING",
+    "CONFIRMING",
+    "CONFIRMED",
+    "REJECTED",
+    name="requeststatus",
+)
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+
+    if op.get_bind().dialect.name == "postgresql":
+        # 原生枚举类型只能追加值，且不能在事务中执行
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE requeststatus ADD VALUE IF NOT EXISTS 'REJECTED'")
+        return
+
+    with op.batch_alter_table("lgc_req_forward_request_info", schema=None) as batch_op:
+        batch_op.alter_column(
+            "status",
+            existing_type=OLD_STATUS,
+            type_=NEW_STATUS,
+            existing_nullable=False,
+        )
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+
+    # 旧版本不区分通过与拒绝，均视为已处理
+    op.execute(
+        "UPDATE lgc_req_forward_request_info"
+        " SET status = 'CONFIRMED' WHERE status = 'REJECTED'",
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        # 原生枚举类型无法删除值，保留即可
+        return
+
+    with op.batch_alter_table("lgc_req_forward_request_info", schema=None) as batch_op:
+        batch_op.alter_column(
+            "status",
+            existing_type=NEW_STATUS,
+            type_=OLD_STATUS,
+            existing_nullable=False,
+        )
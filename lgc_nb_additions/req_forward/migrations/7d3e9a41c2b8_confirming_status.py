@@ -0,0 +1,63 @@
+"""confirming status
+
+迁移 ID: 7d3e9a41c2b8
+父迁移: e2125e6269d0
+创建时间: 2026-10-18 21:12:47.208411
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "7d3e9a41c2b8"
+down_revision: str | Sequence[str] | None = "e2125e6269d0"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+OLD_STATUS = sa.Enum("PENDING", "CONFIRMED", name="requeststatus")
+NEW_STATUS = sa.Enum("PENDING", "CONFIRMING", "CONFIRMED", name="requeststatus")
+
+
+def upgrade(name: str = "") -> None:
+    if name:
+        return
+
+    if op.get_bind().dialect.name == "postgresql":
+        # 原生枚举类型只能追加值，且不能在事务中执行
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE requeststatus ADD VALUE IF NOT EXISTS 'CONFIRMING'")
+        return
+
+    with op.batch_alter_table("lgc_req_forward_request_info", schema=None) as batch_op:
+        batch_op.alter_column(
+            "status",
+            existing_type=OLD_STATUS,
+            type_=NEW_STATUS,
+            existing_nullable=False,
+        )
+
+
+def downgrade(name: str = "") -> None:
+    if name:
+        return
+
+    # 处理中的请求放回待处理
+    op.execute(
+        "UPDATE lgc_req_forward_request_info"
+        " SET status = 'PENDING' WHERE status = 'CONFIRMING'",
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        # 原生枚举类型无法删除值，保留即可
+        return
+
+    with op.batch_alter_table("lgc_req_forward_request_info", schema=None) as batch_op:
+        batch_op.alter_column(
+            "status",
+            existing_type=NEW_STATUS,
+            type_=OLD_STATUS,
+            existing_nullable=False,
+        )
@@ -0,0 +1,138 @@
+import asyncio
+from dataclasses import dataclass
+
+from cookit.loguru import warning_suppress
+from nonebot import get_driver, logger
+from nonebot_plugin_alconna import UniMessage
+from nonebot_plugin_alconna.uniseg import Target
+
+from ..utils.common import get_bot_for_target, target_bot_cache, target_cache_key
+from .config import config
+from .db import EXPIRE_TIME_STR, RequestType
+
+driver = get_driver()
+
+background_tasks: set[asyncio.Task[None]] = set()
+
+
+async def send_with_failover(targets: list[Target], msg: UniMessage) -> bool:
+    for target in targets:
+        with warning_suppress(f"Failed to send notification to {target}"):
+            try:
+                async with asyncio.timeout(config.send_timeout):
+                    await target.send(msg, bot=await get_bot_for_target(target))
+            except Exception:
+                # 发送失败时可能是缓存的 Bot 已不在目标中，下次重新查找
+                target_bot_cache.pop(target_cache_key(target), None)
+                raise
+            return True
+    return False
+
+
+async def send_notification(msg: UniMessage):
+    results = await asyncio.gather(
+        *(send_with_failover(x, msg) for x in config.parsed_targets),
+    )
+    if not all(results):
+        logger.error(
+            f"Failed to send notification to {results.count(False)}"
+            f" of {len(results)} targets",
+        )
+
+
+def dispatch_notification(msg: UniMessage):
+    if not config.parsed_targets:
+        return
+    task = asyncio.create_task(send_notification(msg))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+@dataclass
+class RequestNotice:
+    request_id: str
+    type: RequestType
+    user_id: str
+    guild_id: str | None = None
+
+    @property
+    def description(self) -> str:
+        if self.type is RequestType.FRIEND:
+            return "好友请求"
+        guild_id = self.guild_id or "?"
+        return f"邀群请求 ({guild_id[0]}...{guild_id[-1]})"
+
+
+def build_notice_message(notice: RequestNotice) -> UniMessage:
+    return (
+        UniMessage.text("收到来自 ")
+        .at(notice.user_id)
+        .text(
+            f" 的{notice.description}，请您在 {EXPIRE_TIME_STR} 内发送以下内容自行操作："
+            f"\nconfirm-req {notice.request_id}",
+        )
+    )
+
+
+def build_digest_message(notices: list[RequestNotice]) -> UniMessage:
+    msg = UniMessage.text(
+        f"收到 {len(notices)} 个请求，请您在 {EXPIRE_TIME_STR} 内发送对应内容自行操作：",
+    )
+    for notice in notices:
+        msg = (
+            msg.text("\n")
+            .at(notice.user_id)
+            .text(f" 的{notice.description}：confirm-req {notice.request_id}")
+        )
+    return msg
+
+
+class NoticeDigest:
+    """在一段时间内收集请求通知，合并为一条消息发送"""
+
+    def __init__(self, window: float, max_items: int) -> None:
+        self.window = window
+        self.max_items = max_items
+        self.notices: list[RequestNotice] = []
+        self.timer: asyncio.Task[None] | None = None
+
+    def add(self, notice: RequestNotice):
+        self.notices.append(notice)
+        if len(self.notices) >= self.max_items:
+            self.flush()
+        elif not self.timer:
+            self.timer = asyncio.create_task(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.window)
+        self.timer = None
+        self.flush()
+
+    def flush(self):
+        if self.timer and (self.timer is not asyncio.current_task()):
+            self.timer.cancel()
+            self.timer = None
+        notices, self.notices = self.notices, []
+        if not notices:
+            return
+        if len(notices) == 1:
+            dispatch_notification(build_notice_message(notices[0]))
+        else:
+            dispatch_notification(build_digest_message(notices))
+
+
+notice_digest = NoticeDigest(config.digest_window, config.digest_max_items)
+
+
+def notify_request(notice: RequestNotice):
+    if config.digest:
+        notice_digest.add(notice)
+    else:
+        dispatch_notification(build_notice_message(notice))
+
+
+@driver.on_shutdown
+async def _():
+    notice_digest.flush()
+    if background_tasks:
+        await asyncio.wait(background_tasks, timeout=config.send_timeout)
@@ -0,0 +1,118 @@
+import enum
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import date
+from typing import NamedTuple, Self
+
+from pydantic import BaseModel, Field
+
+from .db import RequestType
+
+
+class PolicyAction(enum.StrEnum):
+    APPROVE = "approve"
+    REJECT = "reject"
+    REVIEW = "review"
+
+
+class PolicyRule(BaseModel):
+    """自动处理规则，未填写的条件匹配任意值"""
+
+    action: PolicyAction
+    types: list[RequestType] | None = None
+    users: list[str] | None = None
+    guilds: list[str] | None = None
+    bots: list[str] | None = None
+    # 是否为可疑好友请求
+    doubt: bool | None = None
+    # 每个 Bot 每天按此规则自动处理的数量上限，用完后跳过此规则
+    daily_quota: int | None = Field(default=None, ge=1)
+
+
+@dataclass(frozen=True, slots=True)
+class RequestFacts:
+    type: RequestType
+    bot_id: str
+    user_id: str
+    guild_id: str | None = None
+    doubt: bool = False
+
+
+def optional_frozenset[T](v: Sequence[T] | None) -> frozenset[T] | None:
+    return None if v is None else frozenset(v)
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledRule:
+    index: int
+    action: PolicyAction
+    types: frozenset[RequestType] | None
+    users: frozenset[str] | None
+    guilds: frozenset[str] | None
+    bots: frozenset[str] | None
+    doubt: bool | None
+    daily_quota: int | None
+
+    @classmethod
+    def compile(cls, index: int, rule: PolicyRule) -> Self:
+        return cls(
+            index=index,
+            action=rule.action,
+            types=optional_frozenset(rule.types),
+            users=optional_frozenset(rule.users),
+            guilds=optional_frozenset(rule.guilds),
+            bots=optional_frozenset(rule.bots),
+            doubt=rule.doubt,
+            daily_quota=rule.daily_quota,
+        )
+
+    def matches(self, facts: RequestFacts) -> bool:
+        # 名单均为集合，单条规则的匹配与名单长度无关
+        return (
+            (self.types is None or facts.type in self.types)
+            and (self.bots is None or facts.bot_id in self.bots)
+            and (self.users is None or facts.user_id in self.users)
+            and (self.guilds is None or facts.guild_id in self.guilds)
+            and (self.doubt is None or facts.doubt is self.doubt)
+        )
+
+
+class PolicyDecision(NamedTuple):
+    action: PolicyAction
+    rule: CompiledRule | None = None
+
+
+class RequestPolicy:
+    """按顺序取第一条匹配且配额未用完的规则，均不匹配时转人工审核"""
+
+    def __init__(self, rules: Sequence[PolicyRule]) -> None:
+        self.rules = [CompiledRule.compile(i, x) for i, x in enumerate(rules)]
+        # (rule index, bot_id): (day, used)
+        self.usage: dict[tuple[int, str], tuple[date, int]] = {}
+
+    def used(self, rule: CompiledRule, bot_id: str) -> int:
+        day, used = self.usage.get((rule.index, bot_id), (None, 0))
+        return used if day == date.today() else 0
+
+    def evaluate(self, facts: RequestFacts) -> PolicyDecision:
+        """匹配到有配额的规则时会立即占用一次配额"""
+
+        for rule in self.rules:
+            if not rule.matches(facts):
+                continue
+            if rule.daily_quota is not None:
+                used = self.used(rule, facts.bot_id)
+                if used >= rule.daily_quota:
+                    continue
+                self.usage[(rule.index, facts.bot_id)] = (date.today(), used + 1)
+            return PolicyDecision(rule.action, rule)
+        return PolicyDecision(PolicyAction.REVIEW)
+
+    def release(self, decision: PolicyDecision, bot_id: str):
+        """自动处理失败时归还占用的配额"""
+
+        rule = decision.rule
+        if (not rule) or (rule.daily_quota is None):
+            return
+        if used := self.used(rule, bot_id):
+            self.usage[(rule.index, bot_id)] = (date.today(), used - 1)
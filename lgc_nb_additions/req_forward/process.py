@@ -0,0 +1,154 @@
+import asyncio
+from collections import defaultdict
+from collections.abc import Sequence
+from datetime import UTC, datetime
+
+from cookit.loguru import warning_suppress
+from nonebot import get_bot, logger
+from nonebot.adapters import Bot as BaseBot
+from nonebot_plugin_apscheduler import scheduler
+from nonebot_plugin_orm import get_session
+from sqlalchemy import update
+
+from ..uniapi.collectors import friend_request_processor, guild_invite_request_processor
+from .config import config
+from .db import RequestInfo, RequestStatus, RequestType, is_pending
+
+type ProcessResult = bool | None | Exception
+
+# 处理中的请求超过 process_timeout 加上该时间仍未完成时视为实例已崩溃
+CLAIM_GRACE_SECONDS = 60
+
+# bot_id: Semaphore
+bot_semaphores = defaultdict[str, asyncio.Semaphore](
+    lambda: asyncio.Semaphore(config.process_concurrency),
+)
+
+
+class RequestClaimedError(Exception):
+    """请求已被其他操作占用或处理"""
+
+
+class RequestProcessError(Exception):
+    """处理请求时出错，异常已记录在日志中"""
+
+
+async def claim_request(rid: str) -> bool:
+    """将待处理的请求原子地标记为处理中"""
+
+    async with get_session() as ss, ss.begin():
+        result = await ss.execute(
+            update(RequestInfo)
+            .where(RequestInfo.id == rid, is_pending())
+            # 保留修改时间，处理失败不应延后请求的过期时间
+            .values(
+                status=RequestStatus.CONFIRMING,
+                modified_at=RequestInfo.modified_at,
+                claimed_at=datetime.now(UTC).timestamp(),
+            ),
+        )
+    return bool(result.rowcount)
+
+
+async def finalize_request(rid: str, processed: bool, approve: bool):
+    """处理成功时按操作标记为已通过或已拒绝，否则放回待处理"""
+
+    if not processed:
+        status = RequestStatus.PENDING
+    elif approve:
+        status = RequestStatus.CONFIRMED
+    else:
+        status = RequestStatus.REJECTED
+
+    async with get_session() as ss, ss.begin():
+        await ss.execute(
+            update(RequestInfo)
+            .where(
+                RequestInfo.id == rid,
+                RequestInfo.status == RequestStatus.CONFIRMING,
+            )
+            .values(status=status, modified_at=RequestInfo.modified_at),
+        )
+
+
+def get_processor(bot: BaseBot, type_: RequestType):
+    if type_ is RequestType.FRIEND:
+        return friend_request_processor.get_from_type_or_instance(bot)
+    return guild_invite_request_processor.get_from_type_or_instance(bot)
+
+
+async def call_processor(
+    bot: BaseBot,
+    type_: RequestType,
+    identifier: str,
+    approve: bool,
+) -> bool | None:
+    """不经过数据库直接处理请求"""
+
+    processor = get_processor(bot, type_)
+    async with bot_semaphores[bot.self_id]:
+        async with asyncio.timeout(config.process_timeout):
+            return await processor(bot, identifier, approve=approve)
+
+
+async def process_request(req: RequestInfo, approve: bool) -> bool | None:
+    """占用请求后在事务外调用 Bot API，最后再更新状态"""
+
+    bot = get_bot(req.bot_id)
+    processor = get_processor(bot, req.type)
+    async with bot_semaphores[req.bot_id]:
+        if not await claim_request(req.id):
+            raise RequestClaimedError(req.id)
+        try:
+            async with asyncio.timeout(config.process_timeout):
+                result = await processor(bot, req.identifier, approve=approve)
+        except Exception:
+            await finalize_request(req.id, processed=False, approve=approve)
+            raise
+        await finalize_request(req.id, is_processed(result), approve)
+        return result
+
+
+async def process_requests(
+    reqs: Sequence[RequestInfo],
+    approve: bool,
+) -> list[ProcessResult]:
+    """并发处理请求，每个 Bot 同时处理的数量受 process_concurrency 限制"""
+
+    async def process(req: RequestInfo) -> ProcessResult:
+        with warning_suppress(f"Failed to process request {req.id}"):
+            try:
+                return await process_request(req, approve)
+            except RequestClaimedError as e:
+                return e
+        return RequestProcessError(req.id)
+
+    return await asyncio.gather(*(process(x) for x in reqs))
+
+
+def is_processed(result: ProcessResult) -> bool:
+    return (result is not False) and (not isinstance(result, Exception))
+
+
+async def recover_stale_claims():
+    stale_before = datetime.now(UTC).timestamp() - (
+        config.process_timeout + CLAIM_GRACE_SECONDS
+    )
+    async with get_session() as ss, ss.begin():
+        result = await ss.execute(
+            update(RequestInfo)
+            .where(
+                RequestInfo.status == RequestStatus.CONFIRMING,
+                RequestInfo.claimed_at < stale_before,
+            )
+            # 过期时间不因恢复而延长
+            .values(
+                status=RequestStatus.PENDING,
+                modified_at=RequestInfo.modified_at,
+            ),
+        )
+    if result.rowcount:
+        logger.warning(f"Recovered {result.rowcount} stale confirming requests")
+
+
+scheduler.add_job(recover_stale_claims, trigger="interval", minutes=1)
@@ -0,0 +1,16 @@
+from cookit.pyd import model_with_alias_generator
+from nonebot import get_plugin_config
+from pydantic import BaseModel, Field
+
+
+@model_with_alias_generator(lambda x: f"lgc_target_sync_{x}")
+class ConfigModel(BaseModel):
+    # 定时全量刷新间隔，单位分钟
+    full_refresh_interval: float = Field(default=60, gt=0)
+    # 所有 Bot 同时进行的刷新数上限
+    refresh_concurrency: int = Field(default=4, ge=1)
+    # 刷新开始前的随机延迟上限，单位秒
+    refresh_jitter: float = Field(default=5, ge=0)
+
+
+config: ConfigModel = get_plugin_config(ConfigModel)
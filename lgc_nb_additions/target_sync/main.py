@@ -1,23 +1,106 @@
+import asyncio
+from collections.abc import MutableMapping
+
 from cookit.loguru import warning_suppress
-from nonebot import logger
+from nonebot import get_bots, get_driver, logger
 from nonebot.adapters import Bot as BaseBot
+from nonebot_plugin_alconna.uniseg import Target
 from nonebot_plugin_alconna.uniseg.adapters import alter_get_fetcher
-from nonebot_plugin_uninfo import Session
+from nonebot_plugin_apscheduler import scheduler
+from nonebot_plugin_uninfo import SceneType, Session
 
 from ..uniapi.collectors import bot_guild_join_listener, bot_guild_quit_listener
-from ..utils.common import call_limiter
-
+from ..utils.common import invalidate_target_bot_cache
+from .config import config
+from .refresher import refresh_scheduler
 
-async def limiter_key_getter(bot: BaseBot, _: Session):  # noqa: ARG001
-    return bot.self_id
+driver = get_driver()
 
 
-@bot_guild_join_listener
-@bot_guild_quit_listener
-@call_limiter(limiter_key_getter)
-async def _(bot: BaseBot, _: Session):
+async def refresh_targets(bot: BaseBot):
     if fn := alter_get_fetcher(bot.adapter.get_name()):
         logger.info(f"Refreshing targets of bot {bot.self_id}")
         with warning_suppress(f"Failed to refresh targets of bot {bot.self_id}"):
             await fn.refresh(bot)
+            invalidate_target_bot_cache(bot.self_id)
             logger.success(f"Finished refreshing targets of bot {bot.self_id}")
+
+
+def schedule_refresh_targets(bot: BaseBot) -> asyncio.Task[None]:
+    task = refresh_scheduler.schedule(bot, refresh_targets)
+    logger.debug(
+        f"Target refresh scheduled for bot {bot.self_id}"
+        f", pending: {refresh_scheduler.pending_count}"
+        f", in flight: {refresh_scheduler.in_flight_count}",
+    )
+    return task
+
+
+def get_cached_targets(bot: BaseBot) -> set[Target] | list[Target] | None:
+    fetcher = alter_get_fetcher(bot.adapter.get_name())
+    cache = getattr(fetcher, "cache", None)
+    if not isinstance(cache, MutableMapping):
+        return None
+    targets = cache.get(bot.self_id)
+    return targets if isinstance(targets, set | list) else None
+
+
+def apply_target_delta(bot: BaseBot, ev: Session, joined: bool) -> bool:
+    """直接修改 fetcher 中缓存的 Target，无法处理时返回 False"""
+
+    scene = ev.scene
+    if scene.type != SceneType.GROUP:
+        return False
+    if (targets := get_cached_targets(bot)) is None:
+        return False
+
+    if not joined:
+        for target in [x for x in targets if x.id == scene.id and not x.private]:
+            targets.remove(target)
+        invalidate_target_bot_cache(bot.self_id)
+        return True
+
+    if any(x.id == scene.id and not x.private for x in targets):
+        return True
+    # 以已缓存的群聊 Target 为模板，保证与 fetcher 产生的 Target 形式一致
+    template = next(
+        (x for x in targets if not x.private and not x.channel and not x.parent_id),
+        None,
+    )
+    if not template:
+        return False
+    target = Target(
+        id=scene.id,
+        self_id=template.self_id,
+        scope=template.scope,
+        adapter=template.adapter,
+    )
+    if isinstance(targets, set):
+        targets.add(target)
+    else:
+        targets.append(target)
+    return True
+
+
+@bot_guild_join_listener
+async def _(bot: BaseBot, ev: Session):
+    if not apply_target_delta(bot, ev, joined=True):
+        schedule_refresh_targets(bot)
+
+
+@bot_guild_quit_listener
+async def _(bot: BaseBot, ev: Session):
+    if not apply_target_delta(bot, ev, joined=False):
+        schedule_refresh_targets(bot)
+
+
+async def refresh_all_targets():
+    await asyncio.gather(*(schedule_refresh_targets(b) for b in get_bots().values()))
+
+
+scheduler.add_job(refresh_all_targets, "interval", minutes=config.full_refresh_interval)
+
+
+@driver.on_bot_disconnect
+async def _(bot: BaseBot):
+    invalidate_target_bot_cache(bot.self_id)
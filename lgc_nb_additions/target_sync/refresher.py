@@ -0,0 +1,63 @@
+import asyncio
+import random
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from typing import Any
+
+from nonebot.adapters import Bot as BaseBot
+
+from .config import config
+
+
+class RefreshScheduler:
+    """全局限制同时进行的刷新数量，同一 Bot 尚未开始的刷新会被合并"""
+
+    def __init__(self, concurrency: int, jitter: float) -> None:
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.jitter = jitter
+        # 等待开始的刷新
+        self.pending: dict[str, asyncio.Task[None]] = {}
+        # 正在进行的刷新
+        self.in_flight: dict[str, asyncio.Task[None]] = {}
+
+    @property
+    def pending_count(self) -> int:
+        return len(self.pending)
+
+    @property
+    def in_flight_count(self) -> int:
+        return len(self.in_flight)
+
+    def schedule(
+        self,
+        bot: BaseBot,
+        func: Callable[[BaseBot], Awaitable[Any]],
+    ) -> asyncio.Task[None]:
+        if task := self.pending.get(bot.self_id):
+            return task
+        task = self.pending[bot.self_id] = asyncio.create_task(self._run(bot, func))
+        return task
+
+    async def _run(self, bot: BaseBot, func: Callable[[BaseBot], Awaitable[Any]]):
+        bot_id = bot.self_id
+        current = asyncio.current_task()
+        try:
+            await asyncio.sleep(random.uniform(0, self.jitter))
+            # 同一 Bot 不并行刷新
+            if running := self.in_flight.get(bot_id):
+                with suppress(Exception):
+                    await asyncio.shield(running)
+            async with self.semaphore:
+                # 开始后收到的新请求需要重新刷新，不能再合并到这次
+                self.pending.pop(bot_id, None)
+                assert current
+                self.in_flight[bot_id] = current
+                await func(bot)
+        finally:
+            if self.pending.get(bot_id) is current:
+                del self.pending[bot_id]
+            if self.in_flight.get(bot_id) is current:
+                del self.in_flight[bot_id]
+
+
+refresh_scheduler = RefreshScheduler(config.refresh_concurrency, config.refresh_jitter)
@@ -1,9 +1,23 @@
+import asyncio
 from contextlib import suppress
 
+from nonebot import get_driver
 from nonebot.plugin import PluginMetadata
+from nonebot_plugin_apscheduler import scheduler
+
+from ..utils.metrics import call_metrics
+from ..utils.store import get_cache_dir
+from . import scene_cache as scene_cache
+from .collectors import (
+    bot_guild_join_listener,
+    bot_guild_quit_listener,
+    friend_request_listener,
+    guild_invite_request_listener,
+)
+from .config import config
 
 with suppress(ImportError):
-    from . import onebot_v11 as _  # noqa: F401
+    from . import onebot_v11 as _
 
 __plugin_meta__ = PluginMetadata(
     name="UniAPI",
@@ -19,3 +33,33 @@ __plugin_meta__ = PluginMetadata(
         "pmn": {"hidden": True},
     },
 )
+
+driver = get_driver()
+
+
+@driver.on_shutdown
+async def _():
+    # 给后台执行的监听器一些时间处理完
+    await asyncio.gather(
+        *(
+            x.wait_spawned(10)
+            for x in (
+                bot_guild_join_listener,
+                bot_guild_quit_listener,
+                friend_request_listener,
+                guild_invite_request_listener,
+            )
+        ),
+    )
+
+
+METRICS_FILE = get_cache_dir("uniapi") / "metrics.prom"
+
+
+async def dump_metrics():
+    await call_metrics.dump(METRICS_FILE)
+
+
+if config.metrics:
+    call_metrics.enabled = True
+    scheduler.add_job(dump_metrics, "interval", seconds=config.metrics_dump_interval)
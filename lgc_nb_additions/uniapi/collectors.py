@@ -1,19 +1,68 @@
 from collections.abc import Awaitable, Callable
-from typing import TYPE_CHECKING, Any, Protocol, override
+from typing import TYPE_CHECKING, Any, Protocol, cast, overload, override
 
 from cookit import TypeDecoCollector
 from nonebot.adapters import Bot as BaseBot
 from nonebot_plugin_uninfo import Session
 from pydantic import BaseModel
 
-from ..utils.common import AsyncCallableListCollector
+from ..utils.common import AsyncCallableListCollector, callable_name
+from ..utils.metrics import call_metrics
+from .config import config
 
 
 class BotTypeCollector[T](TypeDecoCollector[BaseBot, T]):
+    """按 MRO 查找实现，使 Bot 的子类也能使用父类的实现，结果按具体类型缓存"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # 具体类型: 实现，None 为不支持
+        self.resolved: dict[type[BaseBot], T | None] = {}
+
+    @override
+    def set_data_item(self, key: type[BaseBot], value: T, /) -> None:
+        super().set_data_item(key, value)
+        # 新注册的实现可能影响已缓存子类的查找结果
+        self.resolved.clear()
+
+    def resolve(self, bot: BaseBot | type[BaseBot]) -> T | None:
+        cls = bot if isinstance(bot, type) else type(bot)
+        try:
+            return self.resolved[cls]
+        except KeyError:
+            pass
+        value = next((self.data[x] for x in cls.__mro__ if x in self.data), None)
+        self.resolved[cls] = value
+        return value
+
     def supported(self, bot: BaseBot | type[BaseBot]) -> bool:
-        if not isinstance(bot, type):
-            bot = type(bot)
-        return bot in self.data
+        return self.resolve(bot) is not None
+
+    @overload
+    def get_from_type_or_instance(self, obj: BaseBot | type[BaseBot]) -> T: ...
+
+    @overload
+    def get_from_type_or_instance[D](
+        self,
+        obj: BaseBot | type[BaseBot],
+        default: D = ...,
+    ) -> T | D: ...
+
+    @override
+    def get_from_type_or_instance(
+        self,
+        obj: BaseBot | type[BaseBot],
+        default: Any = ...,
+    ) -> Any:
+        value = self.resolve(obj)
+        if value is None:
+            if default is ...:
+                raise KeyError(obj)
+            return default
+        if not call_metrics.enabled:
+            return value
+        func = cast("Callable[..., Awaitable[Any]]", value)
+        return call_metrics.instrument(type(self).__name__, callable_name(func), func)
 
 
 # region group quitter
@@ -48,7 +97,10 @@ class BotGroupJoinListenerCollector(
         def __call__[T: GuildJoinListener](self, obj: T) -> T: ...
 
 
-bot_guild_join_listener = BotGroupJoinListenerCollector()
+bot_guild_join_listener = BotGroupJoinListenerCollector(
+    concurrency=config.listener_concurrency,
+    timeout=config.listener_timeout,
+)
 
 # endregion
 
@@ -66,7 +118,10 @@ class BotGroupQuitListenerCollector(
         def __call__[T: GuildQuitListener](self, obj: T) -> T: ...
 
 
-bot_guild_quit_listener = BotGroupQuitListenerCollector()
+bot_guild_quit_listener = BotGroupQuitListenerCollector(
+    concurrency=config.listener_concurrency,
+    timeout=config.listener_timeout,
+)
 
 # endregion
 
@@ -77,6 +132,8 @@ class FriendRequestData(BaseModel):
     session: Session
     identifier: str
     raw: Any = None
+    # 是否为平台标记的可疑请求
+    doubt: bool = False
 
 
 type FriendRequestListener = Callable[[BaseBot, FriendRequestData], Awaitable[Any]]
@@ -91,7 +148,10 @@ class FriendRequestListenerCollector(
         def __call__[T: FriendRequestListener](self, obj: T) -> T: ...
 
 
-friend_request_listener = FriendRequestListenerCollector()
+friend_request_listener = FriendRequestListenerCollector(
+    concurrency=config.listener_concurrency,
+    timeout=config.listener_timeout,
+)
 
 # endregion
 
@@ -145,7 +205,10 @@ class GuildInviteRequestListenerCollector(
         def __call__[T: GuildInviteRequestListener](self, obj: T) -> T: ...
 
 
-guild_invite_request_listener = GuildInviteRequestListenerCollector()
+guild_invite_request_listener = GuildInviteRequestListenerCollector(
+    concurrency=config.listener_concurrency,
+    timeout=config.listener_timeout,
+)
 
 # endregion
 
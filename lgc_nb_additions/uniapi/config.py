@@ -0,0 +1,24 @@
+from cookit.pyd import model_with_alias_generator
+from nonebot import get_plugin_config
+from pydantic import BaseModel, Field
+
+
+@model_with_alias_generator(lambda x: f"lgc_uniapi_{x}")
+class ConfigModel(BaseModel):
+    scene_cache_ttl: float = 600
+    # 每类监听器同时执行的最大数量，与单个监听器的超时时间（秒）
+    listener_concurrency: int = Field(default=16, ge=1)
+    listener_timeout: float = Field(default=300, gt=0)
+    # 记录各监听器与处理器的调用情况，并定时导出为 Prometheus 文本格式
+    metrics: bool = False
+    metrics_dump_interval: float = Field(default=60, gt=0)
+
+    # OneBot V11 可疑好友请求轮询间隔，单位分钟
+    # 有新请求时回到最小间隔，否则逐次翻倍直到最大间隔
+    doubt_poll_min_interval: float = Field(default=5, gt=0)
+    doubt_poll_max_interval: float = Field(default=60, gt=0)
+    # 单次轮询最多获取的请求数
+    doubt_poll_max_count: int = Field(default=200, ge=10)
+
+
+config: ConfigModel = get_plugin_config(ConfigModel)
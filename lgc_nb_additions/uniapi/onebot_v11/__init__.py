@@ -1,7 +1,7 @@
 import asyncio
-import json
 import random
 import time
+from dataclasses import dataclass
 from typing import TYPE_CHECKING, cast
 
 from cookit.loguru import warning_suppress
@@ -27,7 +27,7 @@ from nonebot_plugin_uninfo import (
 )
 from pydantic import BaseModel, RootModel
 
-from ...utils.store import get_cache_dir
+from ...utils.store import StateStore, get_cache_dir
 from ..collectors import (
     FriendRequestData,
     GuildInviteRequestData,
@@ -39,10 +39,12 @@ from ..collectors import (
     guild_invite_request_processor,
     guild_quitter,
 )
+from ..config import config
 
 driver = get_driver()
 
 DOUBT_FRIEND_PFX = "doubt:"
+DOUBT_FRIEND_PAGE_SIZE = 10
 LAST_FETCH_DOUBT_FRIENDS_TIME_FILE = (
     get_cache_dir("uniapi") / "onebot_v11_last_fetch_doubt_friends_time.json"
 )
@@ -61,19 +63,8 @@ class DoubtFriendRequestInfo(BaseModel):
 
 GetDoubtFriendsAddRequestsData = RootModel[list[DoubtFriendRequestInfo]]
 
-
-def set_last_fetch_doubt_friends_time(data: dict[str, int]):
-    if not (p := LAST_FETCH_DOUBT_FRIENDS_TIME_FILE.parent).exists():
-        p.mkdir(parents=True)
-    LAST_FETCH_DOUBT_FRIENDS_TIME_FILE.write_text(json.dumps(data), "u8")
-
-
-def get_last_fetch_doubt_friends_times() -> dict[str, int]:
-    if LAST_FETCH_DOUBT_FRIENDS_TIME_FILE.exists():
-        return json.loads(
-            LAST_FETCH_DOUBT_FRIENDS_TIME_FILE.read_text("u8"),
-        )
-    return {}
+# bot_id: 上次获取的时间
+last_fetch_doubt_friends_times = StateStore[int](LAST_FETCH_DOUBT_FRIENDS_TIME_FILE)
 
 
 @guild_quitter(Bot)
@@ -89,7 +80,7 @@ async def bot_group_join_rule(ev: GroupIncreaseNoticeEvent):
 
 @on_notice(rule=bot_group_join_rule).handle()
 async def _(bot: Bot, ev: Uninfo):
-    await bot_guild_join_listener.gather(bot, ev)
+    bot_guild_join_listener.spawn(bot, ev)
 
 
 async def bot_group_quit_rule(ev: GroupDecreaseNoticeEvent):
@@ -98,12 +89,12 @@ async def bot_group_quit_rule(ev: GroupDecreaseNoticeEvent):
 
 @on_notice(rule=bot_group_quit_rule).handle()
 async def _(bot: Bot, ev: Uninfo):
-    await bot_guild_quit_listener.gather(bot, ev)
+    bot_guild_quit_listener.spawn(bot, ev)
 
 
 @on_request().handle()
 async def _(bot: Bot, ev: FriendRequestEvent, s: Uninfo):
-    await friend_request_listener.gather(
+    friend_request_listener.spawn(
         bot,
         FriendRequestData(session=s, identifier=ev.flag, raw=ev),
     )
@@ -112,29 +103,89 @@ async def _(bot: Bot, ev: FriendRequestEvent, s: Uninfo):
 async def fetch_and_doubt_req(
     bot: Bot,
     time_after: int | None = None,
-    count: int = 10,
-) -> list[DoubtFriendRequestInfo]:
+    count: int = DOUBT_FRIEND_PAGE_SIZE,
+) -> list[DoubtFriendRequestInfo] | None:
+    """接口没有分页参数，获取到的请求均比 time_after 新时加大 count 重新获取
+
+    获取失败时返回 None"""
+
     with warning_suppress(
         f"Failed to fetch or dispatch doubt friend requests of bot {bot.self_id}",
     ):
-        raw = await bot.get_doubt_friends_add_request(count=count)
-        data = GetDoubtFriendsAddRequestsData.model_validate(raw).root
-        if not time_after:
-            return data
-        if data:
+        while True:
+            raw = await bot.get_doubt_friends_add_request(count=count)
+            data = GetDoubtFriendsAddRequestsData.model_validate(raw).root
+            if not time_after:
+                return data
             end = next((i for i, x in enumerate(data) if x.time <= time_after), None)
-            if end is None:
+            if end is not None:
+                return data[:end]
+            if len(data) < count:
+                return data
+            if count >= config.doubt_poll_max_count:
+                logger.warning(
+                    f"Bot {bot.self_id} has more than {count} new doubt friend"
+                    f" requests, older ones may be missed",
+                )
                 return data
-            return data[:end]
-    return []
+            count = min(count * 2, config.doubt_poll_max_count)
+    return None
+
+
+@dataclass
+class DoubtPollState:
+    # 单位分钟
+    interval: float
+    next_poll: float = 0
+
+
+# bot_id: DoubtPollState
+doubt_poll_states: dict[str, DoubtPollState] = {}
+
+
+def update_doubt_poll_state(bot_id: str, found: bool | None, now: float):
+    """found 为 None 表示获取失败，此时保持原间隔"""
+
+    state = doubt_poll_states.setdefault(
+        bot_id,
+        DoubtPollState(config.doubt_poll_min_interval),
+    )
+    if found:
+        state.interval = config.doubt_poll_min_interval
+    elif found is False:
+        state.interval = min(state.interval * 2, config.doubt_poll_max_interval)
+    state.next_poll = now + state.interval * 60
+
+
+async def dispatch_doubt_friend_req(
+    bot: Bot,
+    requests: list[DoubtFriendRequestInfo],
+):
+    for req in requests:
+        data = FriendRequestData(
+            session=Session(
+                self_id=bot.self_id,
+                adapter=SupportAdapter.onebot11,
+                scope=SupportScope.qq_client,
+                scene=Scene(id=req.uin, type=SceneType.PRIVATE, name=req.nick),
+                user=User(id=req.uin, name=req.nick),
+            ),
+            identifier=f"{DOUBT_FRIEND_PFX}{req.flag}",
+            raw=req,
+            doubt=True,
+        )
+        friend_request_listener.spawn(bot, data)
+        await asyncio.sleep(random.uniform(2, 5))
+
+
+dispatch_tasks: set[asyncio.Task[None]] = set()
 
 
 async def get_and_dispatch_doubt_friend_req(bots: list[Bot] | None = None):
     bots = bots or cast("list[Bot]", await get_bot(adapter="OneBot V11"))
 
     now = int(time.time())
-    times = get_last_fetch_doubt_friends_times()
-    set_last_fetch_doubt_friends_time({**times, **{b.self_id: now for b in bots}})
+    times = await last_fetch_doubt_friends_times.get_all()
 
     logger.debug(
         f"Fetching doubt friend requests for bots: {[b.self_id for b in bots]}",
@@ -142,35 +193,50 @@ async def get_and_dispatch_doubt_friend_req(bots: list[Bot] | None = None):
     bot_requests = await asyncio.gather(
         *(fetch_and_doubt_req(b, times.get(b.self_id, now)) for b in bots),
     )
-    requests_len = sum(len(x) for x in bot_requests)
+    requests_len = sum(len(x) for x in bot_requests if x)
     log_msg = f"Fetched {requests_len} doubt friend requests"
     if requests_len:
         logger.info(log_msg)
     else:
         logger.debug(log_msg)
 
+    # 只有获取成功的 Bot 才推进水位，失败的下次从原水位重新获取
+    await last_fetch_doubt_friends_times.update(
+        {b.self_id: now for b, x in zip(bots, bot_requests) if x is not None},
+    )
     for bot, requests in zip(bots, bot_requests):
-        for req in requests:
-            data = FriendRequestData(
-                session=Session(
-                    self_id=bot.self_id,
-                    adapter=SupportAdapter.onebot11,
-                    scope=SupportScope.qq_client,
-                    scene=Scene(id=req.uin, type=SceneType.PRIVATE, name=req.nick),
-                    user=User(id=req.uin, name=req.nick),
-                ),
-                identifier=f"{DOUBT_FRIEND_PFX}{req.flag}",
-                raw=req,
-            )
-            asyncio.create_task(
-                logger.catch(
-                    friend_request_listener.gather,
-                )(bot, data),
-            )
-            await asyncio.sleep(random.uniform(2, 5))
-
-
-scheduler.add_job(get_and_dispatch_doubt_friend_req, "interval", minutes=30)
+        update_doubt_poll_state(
+            bot.self_id,
+            None if requests is None else bool(requests),
+            now,
+        )
+        if not requests:
+            continue
+        # 逐条分发间隔数秒，放到后台以免阻塞下次轮询
+        task = asyncio.create_task(dispatch_doubt_friend_req(bot, requests))
+        dispatch_tasks.add(task)
+        task.add_done_callback(dispatch_tasks.discard)
+
+
+async def poll_due_doubt_friend_req():
+    """每分钟检查一次，只轮询到达各自间隔的 Bot"""
+
+    now = time.time()
+    bots = [
+        b
+        for b in cast("list[Bot]", await get_bot(adapter="OneBot V11"))
+        if (x := doubt_poll_states.get(b.self_id)) is None or x.next_poll <= now
+    ]
+    if bots:
+        await get_and_dispatch_doubt_friend_req(bots)
+
+
+scheduler.add_job(poll_due_doubt_friend_req, "interval", minutes=1)
+
+
+@driver.on_bot_disconnect
+async def _(bot: BaseBot):
+    doubt_poll_states.pop(bot.self_id, None)
 
 
 # @driver.on_bot_connect
@@ -184,10 +250,12 @@ async def _(bot: BaseBot, identifier: str, approve: bool):
         assert isinstance(bot, Bot)
 
     if identifier.startswith(DOUBT_FRIEND_PFX):
-        if approve:
-            flag = identifier[len(DOUBT_FRIEND_PFX) :]
-            await bot.set_doubt_friends_add_request(flag=flag)
-        return
+        # 可疑好友请求没有拒绝接口，只能等待其过期
+        if not approve:
+            return False
+        flag = identifier[len(DOUBT_FRIEND_PFX) :]
+        await bot.set_doubt_friends_add_request(flag=flag)
+        return None
 
     await bot.set_friend_add_request(flag=identifier, approve=approve)
 
@@ -198,7 +266,7 @@ async def group_invite_rule(ev: GroupRequestEvent):
 
 @on_request(rule=group_invite_rule).handle()
 async def _(bot: Bot, ev: GroupRequestEvent, s: Uninfo):
-    await guild_invite_request_listener.gather(
+    guild_invite_request_listener.spawn(
         bot,
         GuildInviteRequestData(session=s, identifier=ev.flag, raw=ev),
     )
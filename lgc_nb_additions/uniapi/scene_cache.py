@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import defaultdict
+
+from cookit.loguru import warning_suppress
+from nonebot import get_driver, logger
+from nonebot.adapters import Bot as BaseBot
+from nonebot_plugin_uninfo import Scene, SceneType, Session, get_interface
+
+from ..utils.common import extract_guild_scene
+from .collectors import bot_guild_join_listener, bot_guild_quit_listener
+from .config import config
+
+driver = get_driver()
+
+
+class SceneCache:
+    """按 Bot 缓存其所在的群聊 / 频道列表，过期后在下次读取时重新拉取，
+    期间由进退群事件增量更新"""
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.scenes: dict[str, dict[str, Scene]] = {}
+        self.fetched_at: dict[str, float] = {}
+        self.locks = defaultdict[str, asyncio.Lock](asyncio.Lock)
+        # bot_id: {guild_id: (fetched_at, channels)}
+        self.channels: dict[str, dict[str, tuple[float, list[Scene]]]] = {}
+        # 每次退出频道或失效时递增，用于丢弃拉取期间过期的子频道结果
+        self.channel_versions = defaultdict[str, int](int)
+
+    def expired(self, bot_id: str) -> bool:
+        if bot_id not in self.fetched_at:
+            return True
+        return (time.monotonic() - self.fetched_at[bot_id]) > self.ttl
+
+    async def fetch(self, bot: BaseBot) -> dict[str, Scene] | None:
+        if not (itf := get_interface(bot)):
+            logger.warning(f"Cannot get interface for bot {bot.self_id}")
+            return None
+        with warning_suppress(f"Failed to fetch scenes of bot {bot.self_id}"):
+            scenes = [
+                *await itf.get_scenes(SceneType.GROUP),
+                *await itf.get_scenes(SceneType.GUILD),
+            ]
+            return {x.id: x for x in scenes}
+        return None
+
+    async def get(self, bot: BaseBot, refresh: bool = False) -> dict[str, Scene]:
+        """返回值为缓存本身，请勿直接修改"""
+
+        bot_id = bot.self_id
+        if (not refresh) and (not self.expired(bot_id)):
+            return self.scenes[bot_id]
+
+        async with self.locks[bot_id]:
+            # 等锁期间可能已经被其他调用刷新过了
+            if (refresh or self.expired(bot_id)) and (
+                (scenes := await self.fetch(bot)) is not None
+            ):
+                self.scenes[bot_id] = scenes
+                self.fetched_at[bot_id] = time.monotonic()
+            return self.scenes.get(bot_id, {})
+
+    async def get_channels(self, bot: BaseBot, guild_id: str) -> list[Scene] | None:
+        """获取频道下的文字子频道，失败时返回 None"""
+
+        bot_id = bot.self_id
+        if (cached := self.channels.get(bot_id, {}).get(guild_id)) and (
+            (time.monotonic() - cached[0]) <= self.ttl
+        ):
+            return cached[1]
+
+        if not (itf := get_interface(bot)):
+            logger.warning(f"Cannot get interface for bot {bot_id}")
+            return None
+        version = self.channel_versions[bot_id]
+        with warning_suppress(
+            f"Failed to get bot {bot_id} guild {guild_id} channels",
+        ):
+            children = await itf.get_scenes(
+                SceneType.CHANNEL_TEXT,
+                parent_scene_id=guild_id,
+            )
+            # 拉取期间 Bot 可能已断开或退出频道，此时不再写入缓存
+            if self.channel_versions[bot_id] == version:
+                self.channels.setdefault(bot_id, {})[guild_id] = (
+                    time.monotonic(),
+                    children,
+                )
+            return children
+        return None
+
+    def get_scene(self, bot_id: str, scene_id: str) -> Scene | None:
+        return self.scenes.get(bot_id, {}).get(scene_id)
+
+    def add(self, bot_id: str, scene: Scene):
+        if (scenes := self.scenes.get(bot_id)) is not None:
+            scenes[scene.id] = scene
+
+    def discard(self, bot_id: str, scene_id: str):
+        if (scenes := self.scenes.get(bot_id)) is not None:
+            scenes.pop(scene_id, None)
+        if (channels := self.channels.get(bot_id)) is not None:
+            channels.pop(scene_id, None)
+        self.channel_versions[bot_id] += 1
+
+    def invalidate(self, bot_id: str):
+        self.scenes.pop(bot_id, None)
+        self.fetched_at.pop(bot_id, None)
+        self.channels.pop(bot_id, None)
+        self.channel_versions[bot_id] += 1
+
+
+scene_cache = SceneCache(config.scene_cache_ttl)
+
+
+@bot_guild_join_listener
+async def _(bot: BaseBot, ev: Session):
+    if scene := extract_guild_scene(ev):
+        scene_cache.add(bot.self_id, scene)
+
+
+@bot_guild_quit_listener
+async def _(bot: BaseBot, ev: Session):
+    if scene := extract_guild_scene(ev):
+        scene_cache.discard(bot.self_id, scene.id)
+
+
+@driver.on_bot_disconnect
+async def _(bot: BaseBot):
+    scene_cache.invalidate(bot.self_id)
@@ -1,13 +1,17 @@
 import asyncio
-from collections import defaultdict
+import enum
+import inspect
+import time
+from collections import OrderedDict
 from collections.abc import Awaitable, Callable, Coroutine
-from contextlib import suppress
+from contextlib import nullcontext, suppress
+from dataclasses import dataclass, field
 from functools import partial, wraps
+from itertools import islice
 from typing import Any
 
-from cookit import DecoListCollector, with_semaphore
-from debouncer import debounce
-from debouncer.debounce import Debounced
+from cookit import DecoListCollector
+from nonebot import get_bots, logger
 from nonebot.adapters import Bot as BaseBot
 from nonebot_plugin_alconna.uniseg import (
     SupportAdapter,
@@ -18,23 +22,104 @@ from nonebot_plugin_alconna.uniseg import (
 from nonebot_plugin_alconna.uniseg.adapters import alter_get_fetcher
 from nonebot_plugin_uninfo import Session
 
+from .metrics import call_metrics
+
+
+def callable_name(f: Callable[..., Any]) -> str:
+    # 大部分监听器都叫 `_`，附上行号以区分
+    f = inspect.unwrap(f)
+    name = f"{getattr(f, '__module__', '?')}.{getattr(f, '__qualname__', repr(f))}"
+    if code := getattr(f, "__code__", None):
+        name = f"{name}:{code.co_firstlineno}"
+    return name
+
+
+@dataclass
+class CallOutcome[R]:
+    func: Callable[..., Awaitable[R]]
+    result: R | None = None
+    exception: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.exception is None
+
 
 class AsyncCallableListCollector[**P, R](DecoListCollector[Callable[P, Awaitable[R]]]):
+    """`concurrency` 限制所有调用间共享，`timeout` 为单个函数的超时时间"""
+
     def __init__(
         self,
         data: list[Callable[P, Awaitable[R]]] | None = None,
         concurrency: int | None = None,
+        timeout: float | None = None,
     ) -> None:
         super().__init__(data)
         self.concurrency = concurrency
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        self.spawned: set[asyncio.Task[list[CallOutcome[R]]]] = set()
+
+    async def call(
+        self,
+        f: Callable[P, Awaitable[R]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> R:
+        async with self.semaphore or nullcontext():
+            with (
+                call_metrics.measure(type(self).__name__, callable_name(f))
+                if call_metrics.enabled
+                else nullcontext()
+            ):
+                async with asyncio.timeout(self.timeout):
+                    return await f(*args, **kwargs)
 
     async def gather(self, *args: P.args, **kwargs: P.kwargs) -> list[R]:
-        if self.concurrency:
-            sem = asyncio.Semaphore(self.concurrency)
-            callables = [with_semaphore(sem)(f) for f in self.data]
-        else:
-            callables = self.data
-        return await asyncio.gather(*(f(*args, **kwargs) for f in callables))
+        return await asyncio.gather(*(self.call(f, *args, **kwargs) for f in self.data))
+
+    async def call_settled(
+        self,
+        f: Callable[P, Awaitable[R]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> CallOutcome[R]:
+        try:
+            return CallOutcome(f, result=await self.call(f, *args, **kwargs))
+        # 异常记录在结果中交给调用方处理，不影响同批的其他函数
+        except Exception as e:  # noqa: BLE001
+            logger.opt(exception=e).warning(f"Error when calling {callable_name(f)}")
+            return CallOutcome(f, exception=e)
+
+    async def gather_settled(
+        self,
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> list[CallOutcome[R]]:
+        """单个函数出错或超时不影响其他函数，返回每个函数的执行结果"""
+
+        return await asyncio.gather(
+            *(self.call_settled(f, *args, **kwargs) for f in self.data),
+        )
+
+    def spawn(
+        self,
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> asyncio.Task[list[CallOutcome[R]]]:
+        """在后台执行，调用方无需等待"""
+
+        task = asyncio.create_task(self.gather_settled(*args, **kwargs))
+        self.spawned.add(task)
+        task.add_done_callback(self.spawned.discard)
+        return task
+
+    async def wait_spawned(self, timeout: float | None = None):
+        if not self.spawned:
+            return
+        _, pending = await asyncio.wait(self.spawned, timeout=timeout)
+        for task in pending:
+            task.cancel()
 
 
 def parse_target(v: str) -> Target:
@@ -90,11 +175,41 @@ async def bot_for_target_predicate(target: Target, bot: BaseBot) -> bool:
     return False
 
 
+def target_cache_key(target: Target) -> tuple[Any, ...]:
+    return (
+        target.id,
+        target.parent_id,
+        target.channel,
+        target.private,
+        target.self_id,
+        target.scope,
+        target.adapter,
+    )
+
+
+# target_cache_key: bot_id
+target_bot_cache: dict[tuple[Any, ...], str] = {}
+
+
+def invalidate_target_bot_cache(bot_id: str | None = None):
+    if bot_id is None:
+        target_bot_cache.clear()
+        return
+    for k in [k for k, v in target_bot_cache.items() if v == bot_id]:
+        del target_bot_cache[k]
+
+
 async def get_bot_for_target(target: Target) -> BaseBot:
-    return await alconna_get_bot(
+    key = target_cache_key(target)
+    if (bot_id := target_bot_cache.get(key)) and (bot := get_bots().get(bot_id)):
+        return bot
+
+    bot = await alconna_get_bot(
         predicate=partial(bot_for_target_predicate, target),
         index=0,
     )
+    target_bot_cache[key] = bot.self_id
+    return bot
 
 
 def extract_guild_scene(ev: Session):
@@ -113,37 +228,176 @@ def confuse_string(string: str, head: int = 2, tail: int = 2, symbol: str = "*")
 
 
 type CoT[T] = Coroutine[Any, Any, T]
-type DebounceDeco[**P, R] = Callable[
-    [Callable[P, CoT[R]]],
-    Debounced[P, CoT[R | None]],
-]
 
 
-def call_limiter[K, **P, R](
-    key_getter: Callable[P, CoT[K]],
-    debounce_time: float = 0.5,
-):
-    def deco(f: Callable[P, CoT[R]]) -> Callable[P, CoT[R | None]]:
-        debounces = defaultdict[K, DebounceDeco[[], R | None]](
-            lambda: debounce(debounce_time),
+class LimitMode(enum.StrEnum):
+    # 同 key 的连续调用在最后一次调用 wait 秒后执行
+    DEBOUNCE = "debounce"
+    # 同 key 每 wait 秒最多执行一次，期间的调用直接丢弃
+    THROTTLE = "throttle"
+
+
+@dataclass
+class LimiterKeyState[R]:
+    generation: int = 0
+    # 最近一次放行时的 generation，之前的调用不再执行
+    fired_generation: int = 0
+    burst_start: float | None = None
+    last_run: float | None = None
+    task: asyncio.Task[R] | None = None
+    pending: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def idle(self) -> bool:
+        return (not self.pending) and (not self.task or self.task.done())
+
+
+class CallLimiter[K, **P, R]:
+    """按 key 限制函数调用，被防抖 / 节流掉的调用返回 None
+
+    - `max_wait`: 防抖模式下，持续有调用时最多等待这么久也会执行一次
+    - `join_running`: 同 key 任务运行中时，新调用等待并共享其结果，而不是取消它重新执行
+
+    空闲超过 `ttl` 秒的 key 会被清理，`max_keys` 限制保留的 key 数量，
+    超出时优先清理最久未使用的空闲 key"""
+
+    def __init__(
+        self,
+        key_getter: Callable[P, CoT[K]],
+        wait: float = 0.5,
+        ttl: float | None = 600,
+        max_keys: int | None = None,
+        mode: LimitMode = LimitMode.DEBOUNCE,
+        max_wait: float | None = None,
+        join_running: bool = False,
+    ) -> None:
+        self.key_getter = key_getter
+        self.wait = wait
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.mode = mode
+        self.max_wait = max_wait
+        self.join_running = join_running
+        # 按最近使用时间排序，最久未使用的在前
+        self.states = OrderedDict[K, LimiterKeyState[R]]()
+        self.evictions = 0
+
+    @property
+    def live_keys(self) -> int:
+        return len(self.states)
+
+    def touch(self, key: K) -> LimiterKeyState[R]:
+        if state := self.states.get(key):
+            self.states.move_to_end(key)
+        else:
+            state = self.states[key] = LimiterKeyState()
+        state.last_used = time.monotonic()
+        return state
+
+    def evict(self):
+        evicting: list[K] = []
+        if self.ttl is not None:
+            expire_before = time.monotonic() - self.ttl
+            for key, state in self.states.items():
+                if state.last_used > expire_before:
+                    break
+                if state.idle:
+                    evicting.append(key)
+            for key in evicting:
+                del self.states[key]
+            self.evictions += len(evicting)
+
+        if self.max_keys is None or (over := len(self.states) - self.max_keys) <= 0:
+            return
+        evicting = list(islice((k for k, v in self.states.items() if v.idle), over))
+        for key in evicting:
+            del self.states[key]
+        self.evictions += len(evicting)
+
+    def throttle(self, state: LimiterKeyState[R]) -> bool:
+        now = time.monotonic()
+        if (state.last_run is not None) and (now - state.last_run < self.wait):
+            return False
+        state.last_run = now
+        return True
+
+    async def debounce(self, state: LimiterKeyState[R]) -> bool:
+        state.generation += 1
+        generation = state.generation
+        now = time.monotonic()
+        if state.burst_start is None:
+            state.burst_start = now
+
+        delay = self.wait
+        if self.max_wait is not None:
+            delay = min(delay, state.burst_start + self.max_wait - now)
+        await asyncio.sleep(max(delay, 0))
+
+        reached_max_wait = (
+            (self.max_wait is not None)
+            and (state.burst_start is not None)
+            and (time.monotonic() >= state.burst_start + self.max_wait)
         )
-        tasks: dict[K, asyncio.Task[R]] = {}
+        if (state.generation != generation) and (not reached_max_wait):
+            return False
+        # 达到 max_wait 的调用与最后一次调用可能同时醒来，同一窗口只放行一个
+        if generation <= state.fired_generation:
+            return False
+        state.fired_generation = state.generation
+        state.burst_start = None
+        return True
 
-        @wraps(f)
-        async def wrapper(*args: P.args, **kwargs: P.kwargs):
-            key = await key_getter(*args, **kwargs)
-
-            async def create_task():
-                if key in tasks:
-                    tasks[key].cancel()
-                task = asyncio.create_task(f(*args, **kwargs))
-                tasks[key] = task
+    async def run(self, state: LimiterKeyState[R], func: Callable[[], CoT[R]]):
+        if state.task and (not state.task.done()):
+            if self.join_running:
                 with suppress(asyncio.CancelledError):
-                    return await task
+                    return await asyncio.shield(state.task)
                 return None
+            state.task.cancel()
+
+        task = state.task = asyncio.create_task(func())
+        with suppress(asyncio.CancelledError):
+            return await task
+        return None
 
-            return await debounces[key](create_task)()
+    def __call__(self, f: Callable[P, CoT[R]]) -> Callable[P, CoT[R | None]]:
+        @wraps(f)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R | None:
+            key = await self.key_getter(*args, **kwargs)
+            state = self.touch(key)
+            state.pending += 1
+            try:
+                if self.mode is LimitMode.THROTTLE:
+                    passed = self.throttle(state)
+                else:
+                    passed = await self.debounce(state)
+                if not passed:
+                    return None
+                return await self.run(state, partial(f, *args, **kwargs))
+            finally:
+                state.pending -= 1
+                self.touch(key)
+                self.evict()
 
         return wrapper
 
-    return deco
+
+def call_limiter[K, **P, R](
+    key_getter: Callable[P, CoT[K]],
+    wait: float = 0.5,
+    ttl: float | None = 600,
+    max_keys: int | None = None,
+    mode: LimitMode = LimitMode.DEBOUNCE,
+    max_wait: float | None = None,
+    join_running: bool = False,
+) -> CallLimiter[K, P, R]:
+    return CallLimiter(
+        key_getter,
+        wait,
+        ttl,
+        max_keys,
+        mode,
+        max_wait,
+        join_running,
+    )
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from pathlib import Path
+
+from .store import write_text_atomic
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    latency_sum: float = 0
+    # 最后一个为 +Inf
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def observe(self, elapsed: float, error: bool):
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.latency_sum += elapsed
+        self.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+
+def escape_label(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class CallMetrics:
+    """记录各收集器中函数的调用次数、错误次数与耗时分布，未启用时不做任何记录"""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        # (collector, callable): CallStats
+        self.stats: dict[tuple[str, str], CallStats] = {}
+
+    def observe(self, collector: str, func: str, elapsed: float, error: bool):
+        if not (stats := self.stats.get((collector, func))):
+            stats = self.stats[(collector, func)] = CallStats()
+        stats.observe(elapsed, error)
+
+    @contextmanager
+    def measure(self, collector: str, func: str):
+        start = time.perf_counter()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.observe(collector, func, time.perf_counter() - start, error)
+
+    def instrument[**P, R](
+        self,
+        collector: str,
+        func: str,
+        f: Callable[P, Awaitable[R]],
+    ) -> Callable[P, Awaitable[R]]:
+        @wraps(f)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with self.measure(collector, func):
+                return await f(*args, **kwargs)
+
+        return wrapper
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+
+        calls: list[str] = []
+        errors: list[str] = []
+        latency: list[str] = []
+        for (collector, func), stats in self.stats.items():
+            collector_label, func_label = escape_label(collector), escape_label(func)
+            labels = f'collector="{collector_label}",callable="{func_label}"'
+            calls.append(f"lgc_callable_calls_total{{{labels}}} {stats.calls}")
+            errors.append(f"lgc_callable_errors_total{{{labels}}} {stats.errors}")
+            cumulative = 0
+            for le, count in zip((*LATENCY_BUCKETS, "+Inf"), stats.buckets):
+                cumulative += count
+                latency.append(
+                    f'lgc_callable_latency_seconds_bucket{{{labels},le="{le}"}}'
+                    f" {cumulative}",
+                )
+            latency.append(
+                f"lgc_callable_latency_seconds_sum{{{labels}}} {stats.latency_sum}",
+            )
+            latency.append(
+                f"lgc_callable_latency_seconds_count{{{labels}}} {stats.calls}",
+            )
+
+        return "\n".join(
+            [
+                "# HELP lgc_callable_calls_total Total calls",
+                "# TYPE lgc_callable_calls_total counter",
+                *calls,
+                "# HELP lgc_callable_errors_total Calls that raised",
+                "# TYPE lgc_callable_errors_total counter",
+                *errors,
+                "# HELP lgc_callable_latency_seconds Call latency",
+                "# TYPE lgc_callable_latency_seconds histogram",
+                *latency,
+                "",
+            ],
+        )
+
+    async def dump(self, path: Path):
+        await asyncio.to_thread(write_text_atomic, path, self.render())
+
+
+call_metrics = CallMetrics()
@@ -1,4 +1,11 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Any
+
+from cookit.loguru import logged_suppress
 from cookit.nonebot.localstore import ensure_localstore_path_config
+from nonebot import get_driver, logger
 from nonebot_plugin_localstore import (
     get_plugin_cache_dir,
     get_plugin_config_dir,
@@ -22,3 +29,93 @@ def get_config_dir(name: str):
 
 def get_data_dir(name: str):
     return data_dir / name
+
+
+def write_text_atomic(path: Path, text: str):
+    """先写入同目录下的临时文件再替换，避免写入中途崩溃损坏原文件"""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(text, "u8")
+    tmp_path.replace(path)
+
+
+class StateStore[V]:
+    """以 JSON 文件保存的键值状态
+
+    读取走内存缓存，修改后延迟 delay 秒合并写回，写入在线程中原子地进行"""
+
+    def __init__(self, path: Path, delay: float = 1) -> None:
+        self.path = path
+        self.delay = delay
+        self.data: dict[str, V] | None = None
+        self.dirty = False
+        self.lock = asyncio.Lock()
+        self.timer: asyncio.Task[None] | None = None
+        state_stores.append(self)
+
+    def read(self) -> dict[str, V]:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text("u8"))
+        except ValueError:
+            logger.warning(f"State file {self.path} is corrupted, ignoring it")
+            return {}
+
+    async def load(self) -> dict[str, V]:
+        if self.data is None:
+            async with self.lock:
+                if self.data is None:
+                    self.data = await asyncio.to_thread(self.read)
+        return self.data
+
+    async def get(self, key: str, default: Any = None) -> V | Any:
+        return (await self.load()).get(key, default)
+
+    async def get_all(self) -> dict[str, V]:
+        return dict(await self.load())
+
+    async def set(self, key: str, value: V):
+        (await self.load())[key] = value
+        self.flush_later()
+
+    async def update(self, data: dict[str, V]):
+        (await self.load()).update(data)
+        self.flush_later()
+
+    async def delete(self, key: str):
+        if (await self.load()).pop(key, None) is not None:
+            self.flush_later()
+
+    def flush_later(self):
+        self.dirty = True
+        if not self.timer:
+            self.timer = asyncio.create_task(self.flush_after_delay())
+
+    async def flush_after_delay(self):
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.timer = None
+        await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            if (not self.dirty) or (self.data is None):
+                return
+            self.dirty = False
+            text = json.dumps(self.data)
+            with logged_suppress(f"Failed to write state file {self.path}"):
+                await asyncio.to_thread(write_text_atomic, self.path, text)
+                return
+            # 写入失败时保留修改，等下次写回
+            self.dirty = True
+
+
+state_stores: list[StateStore[Any]] = []
+
+
+@get_driver().on_shutdown
+async def _():
+    await asyncio.gather(*(x.flush() for x in state_stores))
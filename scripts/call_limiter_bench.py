@@ -0,0 +1,76 @@
+"""比较 call_limiter 各模式在突发调用下的执行次数
+
+默认场景: 3 秒内共 220 次调用，每 20 次为一组突发，被限制的函数耗时 0.2 秒
+
+用法: python scripts/call_limiter_bench.py
+需要已安装本项目依赖
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import nonebot
+
+nonebot.init(driver="~none")
+
+from lgc_nb_additions.utils.common import LimitMode, call_limiter  # noqa: E402
+
+TOTAL = 220
+BURST = 20
+DURATION = 3
+JOB_TIME = 0.2
+
+
+@dataclass
+class Result:
+    runs: int = 0
+    cancelled: int = 0
+
+
+async def key_getter(*_: Any) -> str:
+    return "key"
+
+
+async def bench(**kwargs: Any) -> Result:
+    result = Result()
+
+    @call_limiter(key_getter, **kwargs)
+    async def job():
+        result.runs += 1
+        try:
+            await asyncio.sleep(JOB_TIME)
+        except asyncio.CancelledError:
+            result.cancelled += 1
+            raise
+
+    bursts = TOTAL // BURST
+    interval = DURATION / bursts
+    tasks: list[asyncio.Task[Any]] = []
+    start = time.monotonic()
+    for i in range(bursts):
+        await asyncio.sleep(max(start + i * interval - time.monotonic(), 0))
+        tasks.extend(asyncio.create_task(job()) for _ in range(BURST))
+    await asyncio.gather(*tasks)
+    return result
+
+
+CASES: dict[str, dict[str, Any]] = {
+    "debounce(0.5)": {"wait": 0.5},
+    "debounce(0.5) + max_wait(1)": {"wait": 0.5, "max_wait": 1},
+    "throttle(0.5)": {"wait": 0.5, "mode": LimitMode.THROTTLE},
+    "debounce(0.1) + cancel": {"wait": 0.1},
+    "debounce(0.1) + join": {"wait": 0.1, "join_running": True},
+}
+
+
+async def main():
+    print(f"{TOTAL} calls in bursts of {BURST} over {DURATION}s, job takes {JOB_TIME}s")
+    for name, kwargs in CASES.items():
+        result = await bench(**kwargs)
+        print(f"{name}: {result.runs} runs, {result.cancelled} cancelled midway")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,184 @@
+"""在两个本地进程中运行 leave_duplicate_group 的多实例协同，二者共享同一个 SQLite 数据库
+
+不连接真实的 Bot，各实例的 Bot 与群列表由下方 INSTANCES 给出，退群只做记录
+运行结束后检查每个群是否恰好保留了一个 Bot
+
+用法: python scripts/leave_duplicate_group_harness.py
+需要已安装本项目依赖与 aiosqlite
+"""
+
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any
+
+ADAPTER = "Harness"
+ROUNDS = 6
+ROUND_INTERVAL = 1
+
+# instance_id: {bot_id: guild_ids}
+INSTANCES: dict[str, dict[str, list[str]]] = {
+    "a": {
+        "a1": ["g1", "g2", "g3", "g4"],
+        "a2": ["g3", "g4", "g5"],
+    },
+    # 每个进程只有一个 Bot，与常见的部署方式相同
+    "b": {
+        "b1": ["g1", "g2", "g4", "g5", "g6"],
+    },
+}
+
+
+def init_nonebot(work_dir: Path, instance_id: str):
+    import nonebot
+
+    nonebot.init(
+        driver="~none",
+        sqlalchemy_database_url=f"sqlite+aiosqlite:///{work_dir / 'shared.db'}",
+        alembic_startup_check=False,
+        localstore_cache_dir=str(work_dir / instance_id / "cache"),
+        localstore_data_dir=str(work_dir / instance_id / "data"),
+        localstore_config_dir=str(work_dir / instance_id / "config"),
+        lgc_leave_duplicate_group_coordinate=True,
+        lgc_leave_duplicate_group_instance_id=instance_id,
+        # 由本脚本手动触发协同
+        lgc_leave_duplicate_group_coordinate_interval=3600,
+        lgc_leave_duplicate_group_quit_burst=100,
+        lgc_leave_duplicate_group_quit_rate=6000,
+    )
+    nonebot.load_plugin("lgc_nb_additions")
+    return nonebot
+
+
+def run_until_done(nonebot: Any, func: Any):
+    async def wrapper():
+        try:
+            await func()
+        finally:
+            os.kill(os.getpid(), signal.SIGINT)
+
+    tasks: set[asyncio.Task[None]] = set()
+
+    @nonebot.get_driver().on_startup
+    async def _():
+        tasks.add(asyncio.create_task(wrapper()))
+
+    nonebot.run()
+
+
+def create_tables(work_dir: Path):
+    nonebot = init_nonebot(work_dir, "init")
+
+    from nonebot_plugin_orm import Model, get_session
+
+    async def create():
+        async with get_session() as ss:
+            conn = await ss.connection()
+            await conn.run_sync(Model.metadata.create_all)
+            await ss.commit()
+
+    run_until_done(nonebot, create)
+
+
+def run_instance(work_dir: Path, instance_id: str):
+    nonebot = init_nonebot(work_dir, instance_id)
+
+    from lgc_nb_additions.leave_duplicate_group import coordination
+    from lgc_nb_additions.leave_duplicate_group.index import indexes
+    from lgc_nb_additions.leave_duplicate_group.quitter import quit_scheduler
+    from lgc_nb_additions.uniapi.collectors import guild_quitter
+
+    class HarnessAdapter:
+        @classmethod
+        def get_name(cls) -> str:
+            return ADAPTER
+
+    class HarnessBot:
+        adapter = HarnessAdapter
+
+        def __init__(self, self_id: str) -> None:
+            self.self_id = self_id
+
+    bots = {x: HarnessBot(x) for x in INSTANCES[instance_id]}
+    for bot_id, guild_ids in INSTANCES[instance_id].items():
+        indexes[ADAPTER].set_bot(bot_id, guild_ids)
+    coordination.get_bots = lambda: bots  # type: ignore
+
+    quits: list[tuple[str, str]] = []
+
+    @guild_quitter(HarnessBot)  # type: ignore
+    async def _(bot: HarnessBot, guild_id: str):
+        quits.append((bot.self_id, guild_id))
+
+    async def scenario():
+        for _ in range(ROUNDS):
+            await coordination.coordinate()
+            await asyncio.sleep(ROUND_INTERVAL)
+        while quit_scheduler.workers:
+            await asyncio.sleep(0.1)
+        (work_dir / f"{instance_id}.json").write_text(json.dumps(quits))
+
+    run_until_done(nonebot, scenario)
+
+
+def check(work_dir: Path) -> bool:
+    remaining = {
+        bot_id: set(guild_ids)
+        for bots in INSTANCES.values()
+        for bot_id, guild_ids in bots.items()
+    }
+    for instance_id in INSTANCES:
+        for bot_id, guild_id in json.loads(
+            (work_dir / f"{instance_id}.json").read_text(),
+        ):
+            print(f"{bot_id} quit {guild_id}")
+            remaining[bot_id].discard(guild_id)
+
+    ok = True
+    for guild_id in sorted(set().union(*remaining.values())):
+        keepers = sorted(b for b, g in remaining.items() if guild_id in g)
+        print(f"{guild_id}: {keepers}")
+        ok = ok and len(keepers) == 1
+    return ok
+
+
+def main():
+    if len(sys.argv) == 3:
+        work_dir, instance_id = Path(sys.argv[1]), sys.argv[2]
+        if instance_id == "init":
+            create_tables(work_dir)
+        else:
+            run_instance(work_dir, instance_id)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        script = Path(__file__).resolve()
+        cwd = script.parent.parent
+        subprocess.run(
+            [sys.executable, str(script), str(work_dir), "init"],
+            cwd=cwd,
+            check=True,
+        )
+        processes = [
+            subprocess.Popen(
+                [sys.executable, str(script), str(work_dir), x],
+                cwd=cwd,
+            )
+            for x in INSTANCES
+        ]
+        for p in processes:
+            p.wait()
+
+        ok = check(work_dir)
+    print("OK" if ok else "FAILED: some guilds do not have exactly one bot")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()